@@ -46,3 +46,5 @@ CREATE TABLE wordlist (
     accepted BOOLEAN NOT NULL,
     reason TEXT
 );
+
+-- Tables added later are created, and filled from existing games, by the bot at startup, see migrations.py
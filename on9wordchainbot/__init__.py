@@ -5,10 +5,15 @@ from typing import Dict, TYPE_CHECKING
 
 import aiohttp
 import asyncpg
-from aiogram import Bot, Dispatcher, types
+from aiogram import Dispatcher, types
 
-from .constants import DB_URI, ON9BOT_TOKEN, TOKEN
+from .checkpoints import CheckpointStore
+from .constants import DB_URI, GAME_CHECKPOINTS, GAME_RESULTS, ON9BOT_TOKEN, TOKEN
 from .filters import filters
+from .leases import Leases
+from .outbox import QueuedBot
+from .results import ResultSpool
+from .timer_wheel import TimerWheel
 
 if TYPE_CHECKING:
     from .models import ClassicGame
@@ -30,17 +35,25 @@ else:
     asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 loop = asyncio.get_event_loop()
-bot = Bot(TOKEN, parse_mode=types.ParseMode.MARKDOWN)
-on9bot = Bot(ON9BOT_TOKEN)
+bot = QueuedBot(TOKEN, parse_mode=types.ParseMode.MARKDOWN)
+on9bot = QueuedBot(ON9BOT_TOKEN)
 dp = Dispatcher(bot)
 session = aiohttp.ClientSession()
 pool: asyncpg.pool.Pool
+timer_wheel = TimerWheel(loop)  # Joining phase and turn deadlines of all games
+checkpoints = CheckpointStore(GAME_CHECKPOINTS)  # Games in progress, resumed after restarts
+leases = Leases()  # Games owned by this host when several hosts share the database
+results = ResultSpool(GAME_RESULTS)  # Results of finished games not saved to the database yet
 
 
 class GlobalState:
     build_time = datetime.now().replace(microsecond=0)
     maint_mode = False
 
+    # With several worker processes, games are split between them by group id, see __main__
+    shard = 0
+    shards = 1
+
     games: Dict[int, "ClassicGame"] = {}  # Group id mapped to game instance
     games_lock: asyncio.Lock = asyncio.Lock()
 
@@ -1,35 +1,354 @@
 import asyncio
+import logging
+import multiprocessing
 import random
+import signal
 import time
 from decimal import ROUND_HALF_UP, getcontext
+from multiprocessing.connection import Connection
+from multiprocessing.context import SpawnContext
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-from aiogram import executor
+from aiogram import Bot, Dispatcher, executor, types
 from periodic import Periodic
 
-from on9wordchainbot import dp, loop, pool, session
+from on9wordchainbot import GlobalState, bot, checkpoints, dp, leases, loop, on9bot, pool, results, session
+from on9wordchainbot.constants import DB_URI, MULTI_NODE, SHARDS
+from on9wordchainbot.migrations import migrate
+from on9wordchainbot.models import GAME_MODES
 from on9wordchainbot.utils import send_admin_group
 from on9wordchainbot.words import Words
 
 random.seed(time.time())
 getcontext().rounding = ROUND_HALF_UP
 
+logger = logging.getLogger(__name__)
+
+WORKER_QUEUE_LIMIT = 10000  # Messages waiting to be written to the pipe of a worker process
+WORKER_SEND_TIMEOUT = 30  # Seconds a worker process may take to read a message from its pipe before it is restarted
+WORKER_RESTART_DELAY = 5  # Seconds between restarts of a worker process
+
+
+async def resume_games() -> None:
+    # Resume games in progress before the last shutdown or crash
+    game_types = {game_type.__name__: game_type for game_type in GAME_MODES}
+    for group_id, state in checkpoints.load(GlobalState.shard, GlobalState.shards):
+        if not await leases.claim(group_id):
+            # Another bot host took the group over meanwhile
+            checkpoints.discard(group_id)
+            continue
+        game = game_types[state["class"]](group_id)
+        game.restore(state)
+        GlobalState.games[group_id] = game
+        asyncio.create_task(game.main_loop())
+
 
 async def on_startup(_) -> None:
+    await migrate(pool)
+
+    # Save results of finished games, starting with those spooled before the last shutdown or crash
+    asyncio.create_task(results.drain(pool, GlobalState.shard, GlobalState.shards, report=send_admin_group))
+
+    if not Words.builder:
+        # Wait for the first worker to build the dictionary if there is none yet, then pick up its rebuilds
+        while not Words.load():
+            await asyncio.sleep(10)
+        await Words.load_overlay()
+        await resume_games()
+        await Periodic(60, Words.reload).start()
+        return
+
     # Notify admin group
     await send_admin_group("Bot starting.")
 
-    await Words.update()
+    # Serve the dictionary compiled before the last restart right away if there is one,
+    # the first update then runs in the background
+    loaded = Words.load()
+    if not loaded:
+        await Words.update()
+    await Words.load_overlay()
+
+    await resume_games()
 
     # Update word list every 3 hours
     task = Periodic(3 * 60 * 60, Words.update)
-    await task.start()
+    await task.start(delay=0 if loaded else None)
 
 
 async def on_shutdown(_) -> None:
+    # Save remaining time of games as of now
+    for game in GlobalState.games.values():
+        game.checkpoint()
+    checkpoints.retain(GlobalState.games, GlobalState.shard, GlobalState.shards)
+
     await asyncio.gather(session.close(), pool.close())
 
 
+def chat_of(update: Dict[str, Any]) -> int:
+    # Route by chat id so that a group's game and every message sent in the group go to the same place,
+    # by user id for updates without a chat (e.g. inline queries)
+    for value in update.values():
+        if isinstance(value, dict):
+            if "chat" in value:
+                return value["chat"]["id"]
+            if "message" in value:
+                return value["message"]["chat"]["id"]
+            if "from" in value:
+                return value["from"]["id"]
+    return 0
+
+
+def shard_of(update: Dict[str, Any], shards: int) -> int:
+    return chat_of(update) % shards
+
+
+async def poll_updates(handle: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+    # Long polling loop passing each update as a dict to handle
+    await dp.skip_updates()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=20)
+        except Exception:
+            logger.exception("Failed to get updates")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await handle(update.to_python())
+
+
+def run_worker(shard: int, shards: int, conn: Connection) -> None:
+    # Runs in a spawned process with its own event loop, database pool and games.
+    # The dictionary snapshot is memory mapped, so all workers share its words and word index (not the DAWG).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Stopped by the supervisor
+    GlobalState.shard, GlobalState.shards = shard, shards
+    bot.outbox.share(shards)
+    on9bot.outbox.share(shards)
+    Words.builder = shard == 0
+    Words.share_overlay = lambda kind, words: conn.send(("words", (kind, words)))
+    Bot.set_current(dp.bot)
+    Dispatcher.set_current(dp)
+    stopped = asyncio.Event()
+
+    def receive() -> None:
+        while conn.poll():
+            try:
+                kind, payload = conn.recv()
+            except EOFError:  # Supervisor died
+                loop.remove_reader(conn.fileno())
+                stopped.set()
+                return
+            if kind == "update":
+                asyncio.create_task(dp.process_update(types.Update(**payload)))
+            elif kind == "words":
+                action, words = payload
+                if action == "add":
+                    Words.add(words, share=False)
+                else:
+                    Words.remove(words, share=False)
+            elif kind == "stop":
+                stopped.set()
+
+    async def serve() -> None:
+        # Updates wait in the pipe until the dictionary is ready
+        await on_startup(dp)
+        loop.add_reader(conn.fileno(), receive)
+        await stopped.wait()
+        loop.remove_reader(conn.fileno())
+        await on_shutdown(dp)
+        await asyncio.gather(bot.close(), on9bot.close())
+
+    loop.run_until_complete(serve())
+
+
+class Worker:
+    # A worker process started by the supervisor, with the messages waiting to be written to its pipe.
+    # Writing to a pipe blocks once its buffer is full, so messages are queued and written from a thread
+    # one at a time, in order.
+
+    __slots__ = ("shard", "process", "conn", "queue")
+
+    def __init__(
+        self, shard: int, shards: int, context: SpawnContext, queue: Optional[asyncio.Queue] = None
+    ) -> None:
+        self.shard = shard
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(shard, shards, child_conn), name=f"shard-{shard}")
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        # Kept across restarts so that messages waiting for a stuck worker go to its replacement
+        self.queue = queue or asyncio.Queue(WORKER_QUEUE_LIMIT)
+
+    def send(self, message: Any) -> bool:
+        # False if the message is dropped since the worker is too far behind
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def drain(self) -> None:
+        # Write queued messages to the pipe. Returns if a write fails or the worker is not reading its pipe.
+        while True:
+            message = await self.queue.get()
+            try:
+                await asyncio.wait_for(loop.run_in_executor(None, self.conn.send, message), WORKER_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Worker {self.shard} did not read its pipe for {WORKER_SEND_TIMEOUT}s")
+                return
+            except OSError:  # Worker died
+                return
+
+    async def run(self) -> None:
+        # Returns when the worker process dies or stops reading its pipe
+        died = loop.create_future()
+        loop.add_reader(self.process.sentinel, lambda: died.done() or died.set_result(None))
+        drainer = asyncio.create_task(self.drain())
+        try:
+            await asyncio.wait((drainer, died), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            loop.remove_reader(self.process.sentinel)
+            drainer.cancel()
+            died.cancel()
+
+    def kill(self) -> None:
+        # Its games are resumed from their checkpoints by the next worker of the shard
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def run_supervisor(shards: int) -> None:
+    # Poll updates in this process and pass each to the worker owning its chat.
+    # A worker that dies or stops reading its pipe is replaced, so one stuck worker does not hold up the others.
+    context = multiprocessing.get_context("spawn")
+    workers = [Worker(shard, shards, context) for shard in range(shards)]
+    stopping = asyncio.Event()
+
+    def relay(source: Worker) -> None:
+        # Pass dictionary overlay changes on to the other workers
+        while source.conn.poll():
+            try:
+                message = source.conn.recv()
+            except EOFError:
+                loop.remove_reader(source.conn.fileno())
+                return
+            for worker in workers:
+                if worker is not source and not worker.send(message):
+                    logger.warning(f"Dropped dictionary change for worker {worker.shard}, too far behind")
+
+    async def supervise(shard: int) -> None:
+        while True:
+            worker = workers[shard]
+            loop.add_reader(worker.conn.fileno(), relay, worker)
+            await worker.run()
+            loop.remove_reader(worker.conn.fileno())
+            if stopping.is_set():
+                return
+            logger.error(f"Worker {shard} stopped, restarting it")
+            worker.kill()
+            await asyncio.sleep(WORKER_RESTART_DELAY)
+            workers[shard] = Worker(shard, shards, context, worker.queue)
+
+    async def route(update: Dict[str, Any]) -> None:
+        worker = workers[shard_of(update, shards)]
+        if not worker.send(("update", update)):
+            logger.warning(f"Dropped update {update['update_id']} for worker {worker.shard}, too far behind")
+
+    supervisors = [loop.create_task(supervise(shard)) for shard in range(shards)]
+    task = loop.create_task(poll_updates(route))
+    loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        loop.run_until_complete(task)
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        pass
+    finally:
+        task.cancel()
+        stopping.set()
+        for worker in workers:
+            if not worker.send(("stop", None)):
+                worker.process.terminate()
+        loop.run_until_complete(
+            asyncio.gather(*(loop.run_in_executor(None, worker.process.join, 30) for worker in workers))
+        )
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for supervisor in supervisors:
+            supervisor.cancel()
+        loop.run_until_complete(
+            asyncio.gather(
+                task, *supervisors, session.close(), pool.close(), bot.close(), on9bot.close(), return_exceptions=True
+            )
+        )
+
+
+def run_node() -> None:
+    # One of several bot hosts sharing the database. The host holding the leader lease polls updates
+    # and passes each to the host owning the game in its chat, see leases.py.
+    # If the leader dies, another host takes over polling within a few seconds.
+    # If this host loses its database connection, its leases are gone and other hosts may start games in its groups,
+    # so it stops its games and exits to be restarted.
+    Bot.set_current(dp.bot)
+    Dispatcher.set_current(dp)
+
+    def process(update: Dict[str, Any]) -> None:
+        asyncio.create_task(dp.process_update(types.Update(**update)))
+
+    async def route(update: Dict[str, Any]) -> None:
+        pid = await leases.route(chat_of(update))
+        if pid == leases.pid:
+            process(update)
+        elif not await leases.forward(pid, update):
+            logger.warning(f"Dropped update {update['update_id']} too large to forward to host {pid}")
+
+    async def lead() -> None:
+        while not await leases.lead():
+            await asyncio.sleep(5)
+        logger.info("Leading, polling updates")
+        await poll_updates(route)
+
+    async def serve() -> None:
+        await leases.connect(DB_URI, process)
+        await on_startup(dp)
+        leader = asyncio.create_task(lead())
+        lost = asyncio.create_task(leases.lost.wait())
+        try:
+            await asyncio.wait((leader, lost), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            leader.cancel()
+            lost.cancel()
+        if leases.lost.is_set():
+            logger.error("Lost database connection holding game leases, stopping")
+            for game in list(GlobalState.games.values()):
+                game.kill()
+            GlobalState.games.clear()
+            checkpoints.retain(GlobalState.games)
+        else:
+            await on_shutdown(dp)
+        await asyncio.gather(bot.close(), on9bot.close(), return_exceptions=True)
+
+    task = loop.create_task(serve())
+    loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        loop.run_until_complete(task)
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        task.cancel()
+        loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        loop.run_until_complete(on_shutdown(dp))
+        loop.run_until_complete(asyncio.gather(bot.close(), on9bot.close(), return_exceptions=True))
+
+
 def main() -> None:
+    if MULTI_NODE:
+        run_node()
+        return
+    if SHARDS > 1:
+        run_supervisor(SHARDS)
+        return
+
     executor.start_polling(
         dp, loop=loop, on_startup=on_startup, on_shutdown=on_shutdown, skip_updates=True
     )
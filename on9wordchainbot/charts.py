@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+import matplotlib.pyplot as plt
+from matplotlib.dates import DateFormatter
+from matplotlib.ticker import MaxNLocator
+
+
+def draw_trends(
+    days: int,
+    today: date,
+    daily_games: Dict[date, int],
+    active_groups: Dict[date, int],
+    active_players: Dict[date, int],
+    game_mode_play_cnt: List[Tuple[int, str]],
+    cumulative_groups: Dict[date, int],
+    cumulative_players: Dict[date, int]
+) -> bytes:
+    # Returns the /trend graphs as a jpg
+    plt.figure(figsize=(15, 8))
+    plt.subplots_adjust(hspace=0.4)
+    plt.suptitle(f"Trends in the Past {days} Days", size=25)
+
+    tp = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    f = DateFormatter("%b %d" if days < 180 else "%b" if days < 335 else "%b %Y")
+
+    sp = plt.subplot(231)
+    sp.xaxis.set_major_formatter(f)
+    sp.yaxis.set_major_locator(MaxNLocator(integer=True))  # Force y-axis intervals to be integral
+    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
+    plt.title("Games Played", size=18)
+    plt.plot(tp, [daily_games.get(i, 0) for i in tp])
+    plt.ylim(ymin=0)
+
+    sp = plt.subplot(232)
+    sp.xaxis.set_major_formatter(f)
+    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
+    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
+    plt.title("Active Groups", size=18)
+    plt.plot(tp, [active_groups.get(i, 0) for i in tp])
+    plt.ylim(ymin=0)
+
+    sp = plt.subplot(233)
+    sp.xaxis.set_major_formatter(f)
+    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
+    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
+    plt.title("Active Players", size=18)
+    plt.plot(tp, [active_players.get(i, 0) for i in tp])
+    plt.ylim(ymin=0)
+
+    plt.subplot(234)
+    labels = [i[1] for i in game_mode_play_cnt]
+    colors = [
+        "dark maroon",
+        "dark peach",
+        "orange",
+        "leather",
+        "mustard",
+        "teal",
+        "french blue",
+        "booger",
+        "pink"
+    ]
+    total_games = sum(i[0] for i in game_mode_play_cnt)
+    slices, text = plt.pie(
+        [i[0] for i in game_mode_play_cnt],
+        labels=[
+            f"{i[0] / total_games:.1%} ({i[0]})" if i[0] / total_games >= 0.03 else ""
+            for i in game_mode_play_cnt
+        ],
+        colors=["xkcd:" + c for c in colors[len(colors) - len(game_mode_play_cnt):]],
+        startangle=90
+    )
+    plt.legend(slices, labels, title="Oynanan Oyun Modları", fontsize="x-small", loc="best")
+    plt.axis("equal")
+
+    sp = plt.subplot(235)
+    sp.xaxis.set_major_formatter(f)
+    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
+    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
+    plt.title("Kümülatif Gruplar", size=18)
+    plt.plot(tp, [cumulative_groups[i] for i in tp])
+
+    sp = plt.subplot(236)
+    sp.xaxis.set_major_formatter(f)
+    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
+    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
+    plt.title("Kümülatif Oyuncular", size=18)
+    plt.plot(tp, [cumulative_players[i] for i in tp])
+
+    buffer = BytesIO()
+    plt.savefig(buffer, format="jpg", bbox_inches="tight")
+    plt.close("all")
+    return buffer.getvalue()
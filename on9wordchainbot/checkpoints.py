@@ -0,0 +1,50 @@
+import logging
+import pickle
+import sqlite3
+from typing import Any, Collection, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    # Latest state of each game in progress, kept in a local SQLite database so games survive restarts.
+    # Every write is a single autocommitted upsert, and WAL mode keeps committed writes durable
+    # if the process gets killed. A state identical to the one last saved for the game is not written again.
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.execute("PRAGMA synchronous = NORMAL;")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS game (group_id INTEGER PRIMARY KEY, state BLOB NOT NULL);")
+        self.saved: Dict[int, bytes] = {}  # Group id mapped to the state last written
+
+    def save(self, group_id: int, state: Dict[str, Any]) -> None:
+        data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        if self.saved.get(group_id) == data:
+            return
+        self.conn.execute("INSERT OR REPLACE INTO game (group_id, state) VALUES (?, ?);", (group_id, data))
+        self.saved[group_id] = data
+
+    def discard(self, group_id: int) -> None:
+        self.saved.pop(group_id, None)
+        self.conn.execute("DELETE FROM game WHERE group_id = ?;", (group_id,))
+
+    def retain(self, group_ids: Collection[int], shard: int = 0, shards: int = 1) -> None:
+        # Drop checkpoints of every game of the shard not in group_ids
+        with self.conn:  # One transaction
+            self.conn.execute("BEGIN;")
+            for (group_id,) in self.conn.execute("SELECT group_id FROM game;").fetchall():
+                if group_id % shards == shard and group_id not in group_ids:
+                    self.saved.pop(group_id, None)
+                    self.conn.execute("DELETE FROM game WHERE group_id = ?;", (group_id,))
+
+    def load(self, shard: int = 0, shards: int = 1) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        # Games of the shard
+        for group_id, state in self.conn.execute("SELECT group_id, state FROM game;").fetchall():
+            if group_id % shards != shard:
+                continue
+            try:
+                yield group_id, pickle.loads(state)
+            except Exception:
+                logger.exception(f"Unreadable checkpoint of game in group {group_id}")
+                self.discard(group_id)
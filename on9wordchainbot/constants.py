@@ -20,8 +20,13 @@ OFFICIAL_GROUP_ID = config["OFFICIAL_GROUP_ID"]
 WORD_ADDITION_CHANNEL_ID = config["WORD_ADDITION_CHANNEL_ID"]
 VIP = config["VIP"]
 VIP_GROUP = config["VIP_GROUP"]
+SHARDS = config.get("SHARDS", 1)  # Worker processes to split games between
+MULTI_NODE = config.get("MULTI_NODE", False)  # Several bot hosts sharing the database, see leases.py
 
 WORDLIST_SOURCE = "https://github.com/01-Meyitzade-01/Turkce-kelime/blob/master/words.txt"
+DICTIONARY_SNAPSHOT = "words.snapshot"  # Compiled dictionary kept between restarts
+GAME_CHECKPOINTS = "games.sqlite3"  # Games in progress kept between restarts
+GAME_RESULTS = "results.sqlite3"  # Results of finished games waiting to be saved to the database
 
 STAR = "\u2b50\ufe0f"
 
@@ -35,6 +40,7 @@ class GameState:
 class GameSettings:
     JOINING_PHASE_SECONDS = 60
     MAX_JOINING_PHASE_SECONDS = 180
+    ROSTER_ANNOUNCEMENT_DELAY = 5  # Seconds to collect joins and flees for one announcement
     MIN_PLAYERS = 2
     MAX_PLAYERS = 50
     INCREASED_MAX_PLAYERS = 300
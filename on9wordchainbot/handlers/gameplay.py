@@ -5,7 +5,7 @@ from typing import Type
 from aiogram import types
 from aiogram.dispatcher.filters import RegexpCommandsFilter
 
-from .. import GlobalState, dp, on9bot
+from .. import GlobalState, dp, leases, on9bot
 from ..constants import GameSettings, GameState, VIP, VIP_GROUP
 from ..models import ClassicGame, EliminationGame, GAME_MODES, MixedEliminationGame
 from ..utils import amt_donated, send_groups_only_message
@@ -57,6 +57,9 @@ async def start_game(message: types.Message, game_type: Type[ClassicGame]) -> No
     async with GlobalState.games_lock:  # Avoid duplicate game creation
         if group_id in GlobalState.games:
             asyncio.create_task(GlobalState.games[group_id].join(message))
+        elif not await leases.claim(group_id):
+            # Another bot host started a game in the group meanwhile
+            return
         else:
             game = game_type(message.chat.id)
             GlobalState.games[group_id] = game
@@ -127,12 +130,13 @@ async def cmd_killgame(message: types.Message) -> None:
         await message.reply(f"`{e.__class__.__name__}: {e}`", allow_sending_without_reply=True)
         return
 
-    GlobalState.games[group_id].state = GameState.KILLGAME
+    game = GlobalState.games[group_id]
+    game.kill()
     await asyncio.sleep(2)
 
     # If game is still not terminated
-    if group_id in GlobalState.games:
-        del GlobalState.games[group_id]
+    if GlobalState.games.get(group_id) is game:
+        game.unregister()
         await message.reply("Game ended forcibly.", allow_sending_without_reply=True)
 
 
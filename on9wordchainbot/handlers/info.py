@@ -118,9 +118,13 @@ async def cmd_runinfo(message: types.Message) -> None:
             f"Build time: `{build_time_str}`\n"
             f"Uptime: `{uptime.days}.{str(uptime).rsplit(maxsplit=1)[-1]}`\n"
             f"Words in dictionary: `{Words.count}`\n"
+            f"Dictionary build time: `{Words.build_time:.3f}s` (event loop `{Words.load_time:.3f}s`)\n"
             f"Total games: `{len(GlobalState.games)}`\n"
             f"Running games: `{len([g for g in GlobalState.games.values() if g.state == GameState.RUNNING])}`\n"
-            f"Players: `{sum(len(g.players) for g in GlobalState.games.values())}`"
+            f"Players: `{sum(len(g.players) for g in GlobalState.games.values())}`\n"
+            f"Queued messages: `{bot.outbox.depth}` (peak `{bot.outbox.peak_depth}`, "
+            f"longest chat queue `{bot.outbox.longest_queue()}`)\n"
+            f"Messages sent: `{bot.outbox.sent}` (flood control retries `{bot.outbox.retries}`)"
         ),
         allow_sending_without_reply=True
     )
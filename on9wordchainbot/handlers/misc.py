@@ -9,8 +9,9 @@ from aiogram.utils.exceptions import (BadRequest, BotBlocked, BotKicked, CantIni
 
 from .donation import send_donate_invoice
 from .. import GlobalState, bot, dp, pool
-from ..constants import ADMIN_GROUP_ID, GameState, OFFICIAL_GROUP_ID, VIP
+from ..constants import ADMIN_GROUP_ID, OFFICIAL_GROUP_ID, VIP
 from ..models import GAME_MODES
+from ..results import migrate_group_stats
 from ..utils import ADD_TO_GROUP_KEYBOARD, amt_donated, is_word, send_admin_group
 from ..words import Words
 
@@ -138,7 +139,7 @@ async def inline_handler(inline_query: types.InlineQuery):
         return
 
     res = []
-    for word in Words.dawg.iterkeys(text):
+    for word in Words.iterkeys(text):
         word = word.capitalize()
         res.append(
             types.InlineQueryResultArticle(
@@ -205,7 +206,7 @@ async def error_handler(update: types.Update, error: TelegramAPIError) -> None:
             asyncio.create_task(
                 send_admin_group(f"Game moved from {group_id} to {error.migrate_to_chat_id}.")
             )
-        async with pool.acquire() as conn:
+        async with pool.acquire() as conn, conn.transaction():
             await conn.execute(
                 "UPDATE game SET group_id = $1 WHERE group_id = $2;",
                 error.migrate_to_chat_id, group_id
@@ -216,6 +217,7 @@ async def error_handler(update: types.Update, error: TelegramAPIError) -> None:
             )
             await conn.execute("DELETE FROM game WHERE group_id = $1;", group_id)
             await conn.execute("DELETE FROM gameplayer WHERE group_id = $1;", group_id)
+            await migrate_group_stats(conn, group_id, error.migrate_to_chat_id)
         await send_admin_group(f"Group statistics migrated from {group_id} to {error.migrate_to_chat_id}.")
         return
 
@@ -248,10 +250,11 @@ async def error_handler(update: types.Update, error: TelegramAPIError) -> None:
                 allow_sending_without_reply=True
             )
         )
-        GlobalState.games[group_id].state = GameState.KILLGAME
+        game = GlobalState.games[group_id]
+        game.kill()
         await asyncio.sleep(2)
 
         # If game is still not terminated
-        if group_id in GlobalState.games:
-            del GlobalState.games[group_id]
+        if GlobalState.games.get(group_id) is game:
+            game.unregister()
             await update.message.reply("Oyun zorla sona erdi.", allow_sending_without_reply=True)
@@ -1,20 +1,16 @@
 import asyncio
-import os
 import time
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Tuple
+from datetime import date, datetime, timedelta
+from io import BytesIO
 
-import aiofiles
-import aiofiles.os
-import matplotlib.pyplot as plt
 from aiocache import cached
 from aiogram import types
 from aiogram.utils.markdown import quote_html
-from asyncpg import Record
-from matplotlib.dates import DateFormatter
-from matplotlib.ticker import MaxNLocator
 
 from .. import dp, pool
+from ..charts import draw_trends
+from ..process_pool import get_executor
+from ..results import rebuild_daily_stats
 from ..utils import has_star, send_groups_only_message
 
 
@@ -52,16 +48,17 @@ async def cmd_stats(message: types.Message) -> None:
 async def cmd_groupstats(message: types.Message) -> None:
     # TODO: Add top players in group (max 5) to message
     async with pool.acquire() as conn:
-        player_cnt, game_cnt, word_cnt, letter_cnt = await conn.fetchrow(
+        res = await conn.fetchrow(
             """\
-            SELECT COUNT(DISTINCT user_id), COUNT(DISTINCT game_id), SUM(word_count), SUM(letter_count)
-                FROM gameplayer
+            SELECT player_count, game_count, word_count, letter_count
+                FROM group_stats
                 WHERE group_id = $1;""",
             message.chat.id
         )
+    player_cnt, game_cnt, word_cnt, letter_cnt = res or (0, 0, 0, 0)
     await message.reply(
         (
-            f"\<b>{quote_html(message.chat.title)}</b> için U0001f4ca İstatistikleri\n"
+            f"<b>{quote_html(message.chat.title)}</b> için \U0001f4ca İstatistikleri\n"
             f"<b>{player_cnt}</b> oyuncular\n"
             f"<b>{game_cnt}</b> oynanan oyunlar\n"
             f"<b>{word_cnt}</b> oynanan toplam kelime\n"
@@ -74,24 +71,13 @@ async def cmd_groupstats(message: types.Message) -> None:
 
 @cached(ttl=5)
 async def get_global_stats() -> str:
-    async def get_cnt_1() -> Tuple[int, int]:
-        async with pool.acquire() as conn:
-            group_cnt, game_cnt = await conn.fetchrow(
-                "SAYI SEÇ(DISTINCT group_id), COUNT(*) oyundan;"
-            )
-        return group_cnt, game_cnt
-
-    async def get_cnt_2() -> Tuple[int, int, int]:
-        async with pool.acquire() as conn:
-            player_cnt, word_cnt, letter_cnt = await conn.fetchrow(
-                "Oyuncudan SAYI SEÇ(*), SUM(kelime_sayısı), SUM(harf_sayısı);"
-            )
-            return player_cnt, word_cnt, letter_cnt
-
-    get_cnt_1_task = asyncio.create_task(get_cnt_1())
-    get_cnt_2_task = asyncio.create_task(get_cnt_2())
-    group_cnt, game_cnt = await get_cnt_1_task
-    player_cnt, word_cnt, letter_cnt = await get_cnt_2_task
+    async with pool.acquire() as conn:
+        group_cnt, player_cnt, game_cnt, word_cnt, letter_cnt = await conn.fetchrow(
+            """\
+            SELECT group_count, player_count, game_count, word_count, letter_count
+                FROM global_stats
+                WHERE id;"""
+        )
 
     return (
         "\U0001f4ca Küresel istatistikler\n"
@@ -108,6 +94,17 @@ async def cmd_globalstats(message: types.Message) -> None:
     await message.reply(await get_global_stats(), allow_sending_without_reply=True)
 
 
+@dp.message_handler(is_owner=True, commands="rebuildtrends")
+async def cmd_rebuildtrends(message: types.Message) -> None:
+    # Refill the daily statistics tables from all saved games, e.g. after editing games by hand
+    t = time.time()
+    async with pool.acquire() as conn, conn.transaction():
+        await rebuild_daily_stats(conn)
+    await message.reply(
+        f"Daily statistics rebuilt in `{time.time() - t:.3f}s`.", allow_sending_without_reply=True
+    )
+
+
 @dp.message_handler(is_owner=True, commands=["trend", "trends"])
 async def cmd_trends(message: types.Message) -> None:
     try:
@@ -118,239 +115,59 @@ async def cmd_trends(message: types.Message) -> None:
         return
 
     t = time.time()  # Measure time used to generate graphs
-    today = datetime.now().date()
-
-    async def get_daily_games() -> Dict[str, Any]:
-        async with pool.acquire() as conn:
-            return dict(
-                await conn.fetch(
-                    """\
-                    SELECT start_time::DATE d, COUNT(start_time::DATE)
-                        FROM game
-                        WHERE start_time::DATE >= $1
-                        GROUP BY d
-                        ORDER BY d;""",
-                    today - timedelta(days=days - 1)
-                )
-            )
-
-    async def get_active_players() -> Dict[str, Any]:
-        async with pool.acquire() as conn:
-            return dict(
-                await conn.fetch(
-                    """\
-                    SELECT game.start_time::DATE d, COUNT(DISTINCT gameplayer.user_id)
-                        FROM gameplayer
-                        INNER JOIN game ON gameplayer.game_id = game.id
-                        WHERE game.start_time::DATE >= $1
-                        GROUP BY d
-                        ORDER BY d;""",
-                    today - timedelta(days=days - 1)
-                )
-            )
-
-    async def get_active_groups() -> Dict[str, Any]:
-        async with pool.acquire() as conn:
-            return dict(
-                await conn.fetch(
-                    """\
-                    SELECT start_time::DATE d, COUNT(DISTINCT group_id)
-                        FROM game
-                        WHERE game.start_time::DATE >= $1
-                        GROUP BY d
-                        ORDER BY d;""",
-                    today - timedelta(days=days - 1)
-                )
-            )
-
-    async def get_cumulative_groups() -> Dict[str, Any]:
-        async with pool.acquire() as conn:
-            return dict(
-                await conn.fetch(
-                    """\
-                    SELECT *
-                        FROM (
-                            SELECT d, SUM(count) OVER (ORDER BY d)
-                                FROM (
-                                    SELECT d, COUNT(group_id)
-                                        FROM (
-                                            SELECT DISTINCT group_id, MIN(start_time::DATE) d
-                                                FROM game
-                                                GROUP BY group_id
-                                        ) gd
-                                        GROUP BY d
-                                ) dg
-                        ) ds
-                        WHERE d >= $1;""",
-                    today - timedelta(days=days - 1)
-                )
-            )
-
-    async def get_cumulative_players() -> Dict[str, Any]:
-        async with pool.acquire() as conn:
-            return dict(
-                await conn.fetch(
-                    """\
-                    SELECT *
-                        FROM (
-                            SELECT d, SUM(count) OVER (ORDER BY d)
-                                FROM (
-                                    SELECT d, COUNT(user_id)
-                                        FROM (
-                                            SELECT DISTINCT user_id, MIN(start_time::DATE) d
-                                                FROM gameplayer
-                                                INNER JOIN game ON game_id = game.id
-                                                GROUP BY user_id
-                                        ) ud
-                                        GROUP BY d
-                                ) du
-                        ) ds
-                        WHERE d >= $1;""",
-                    today - timedelta(days=days - 1)
-                )
-            )
-
-    async def get_game_mode_play_cnt() -> List[Record]:
-        async with pool.acquire() as conn:
-            return await conn.fetch(
-                """\
-                SELECT COUNT(game_mode), game_mode
-                    FROM game
-                    WHERE start_time::DATE >= $1
-                    GROUP BY game_mode
-                    ORDER BY count;""",
-                today - timedelta(days=days - 1)
-            )
-
-    # Execute multiple db queries at once for speed
-    (
-        daily_games,
-        active_players,
-        active_groups,
-        cumulative_groups,
-        cumulative_players,
-        game_mode_play_cnt
-    ) = await asyncio.gather(
-        get_daily_games(),
-        get_active_players(),
-        get_active_groups(),
-        get_cumulative_groups(),
-        get_cumulative_players(),
-        get_game_mode_play_cnt()
+    photo = await get_trends(days, datetime.now().date())
+    await message.reply_photo(
+        types.InputFile(BytesIO(photo), "trends.jpg"), caption=f"Oluşturma süresi: `{time.time() - t:.3f}s`"
     )
 
-    # Handle the possible issue of no games played in a day,
-    # so there are no gaps in the cumulative graphs
-    # (probably never happens)
 
-    dt = today - timedelta(days=days)
-    for i in range(days):
-        dt += timedelta(days=1)
-        if dt not in cumulative_groups:
-            if i == 0:
-                async with pool.acquire() as conn:
-                    cumulative_groups[dt] = await conn.fetchval(
-                        "SELECT COUNT(DISTINCT group_id) FROM game WHERE start_time::DATE <= $1;", dt
-                    )
-            else:
-                cumulative_groups[dt] = cumulative_groups[dt - timedelta(days=1)]
-
-    dt = today - timedelta(days=days)
-    for i in range(days):
+@cached(ttl=10 * 60)
+async def get_trends(days: int, today: date) -> bytes:
+    # The graphs as a jpg, cached by number of days and date
+    # Read from the daily statistics tables, one row per day and game mode at most.
+    # One snapshot so that the totals match the daily counts.
+    start = today - timedelta(days=days - 1)
+    async with pool.acquire() as conn, conn.transaction(isolation="repeatable_read", readonly=True):
+        daily_rows = await conn.fetch(
+            """\
+            SELECT day, game_count, group_count, player_count, new_group_count, new_player_count
+                FROM daily_stats
+                WHERE day >= $1
+                ORDER BY day;""",
+            start
+        )
+        game_mode_play_cnt = await conn.fetch(
+            """\
+            SELECT SUM(game_count)::INTEGER count, game_mode
+                FROM daily_game_mode
+                WHERE day >= $1
+                GROUP BY game_mode
+                ORDER BY count;""",
+            start
+        )
+        group_cnt, player_cnt = await conn.fetchrow("SELECT group_count, player_count FROM global_stats WHERE id;")
+
+    daily_games = {row["day"]: row["game_count"] for row in daily_rows}
+    active_groups = {row["day"]: row["group_count"] for row in daily_rows}
+    active_players = {row["day"]: row["player_count"] for row in daily_rows}
+    new_groups = {row["day"]: row["new_group_count"] for row in daily_rows}
+    new_players = {row["day"]: row["new_player_count"] for row in daily_rows}
+
+    # Work out cumulative counts backwards from the current totals,
+    # so days without games need no special handling
+    group_cnt -= sum(new_groups.values())
+    player_cnt -= sum(new_players.values())
+    cumulative_groups = {}
+    cumulative_players = {}
+    dt = start
+    for _ in range(days):
+        group_cnt += new_groups.get(dt, 0)
+        player_cnt += new_players.get(dt, 0)
+        cumulative_groups[dt] = group_cnt
+        cumulative_players[dt] = player_cnt
         dt += timedelta(days=1)
-        if dt not in cumulative_players:
-            if i == 0:
-                async with pool.acquire() as conn:
-                    cumulative_players[dt] = await conn.fetchval(
-                        """\
-                        SELECT COUNT(DISTINCT user_id)
-                            FROM gameplayer
-                            INNER JOIN game ON game_id = game.id
-                            WHERE start_time <= $1;""",
-                        dt
-                    )
-            else:
-                cumulative_players[dt] = cumulative_players[dt - timedelta(days=1)]
-
-    while os.path.exists("trends.jpg"):  # Another /trend command has not finished processing
-        await asyncio.sleep(0.1)
-
-    # Draw graphs
 
-    plt.figure(figsize=(15, 8))
-    plt.subplots_adjust(hspace=0.4)
-    plt.suptitle(f"Trends in the Past {days} Days", size=25)
-
-    tp = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
-    f = DateFormatter("%b %d" if days < 180 else "%b" if days < 335 else "%b %Y")
-
-    sp = plt.subplot(231)
-    sp.xaxis.set_major_formatter(f)
-    sp.yaxis.set_major_locator(MaxNLocator(integer=True))  # Force y-axis intervals to be integral
-    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
-    plt.title("Games Played", size=18)
-    plt.plot(tp, [daily_games.get(i, 0) for i in tp])
-    plt.ylim(ymin=0)
-
-    sp = plt.subplot(232)
-    sp.xaxis.set_major_formatter(f)
-    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
-    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
-    plt.title("Active Groups", size=18)
-    plt.plot(tp, [active_groups.get(i, 0) for i in tp])
-    plt.ylim(ymin=0)
-
-    sp = plt.subplot(233)
-    sp.xaxis.set_major_formatter(f)
-    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
-    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
-    plt.title("Active Players", size=18)
-    plt.plot(tp, [active_players.get(i, 0) for i in tp])
-    plt.ylim(ymin=0)
-
-    plt.subplot(234)
-    labels = [i[1] for i in game_mode_play_cnt]
-    colors = [
-        "dark maroon",
-        "dark peach",
-        "orange",
-        "leather",
-        "mustard",
-        "teal",
-        "french blue",
-        "booger",
-        "pink"
-    ]
-    total_games = sum(i[0] for i in game_mode_play_cnt)
-    slices, text = plt.pie(
-        [i[0] for i in game_mode_play_cnt],
-        labels=[
-            f"{i[0] / total_games:.1%} ({i[0]})" if i[0] / total_games >= 0.03 else ""
-            for i in game_mode_play_cnt
-        ],
-        colors=["xkcd:" + c for c in colors[len(colors) - len(game_mode_play_cnt):]],
-        startangle=90
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(), draw_trends, days, today, daily_games, active_groups, active_players,
+        [tuple(row) for row in game_mode_play_cnt], cumulative_groups, cumulative_players
     )
-    plt.legend(slices, labels, title="Oynanan Oyun Modları", fontsize="x-small", loc="best")
-    plt.axis("equal")
-
-    sp = plt.subplot(235)
-    sp.xaxis.set_major_formatter(f)
-    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
-    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
-    plt.title("Kümülatif Gruplar", size=18)
-    plt.plot(tp, [cumulative_groups[i] for i in tp])
-
-    sp = plt.subplot(236)
-    sp.xaxis.set_major_formatter(f)
-    sp.yaxis.set_major_locator(MaxNLocator(integer=True))
-    plt.setp(sp.xaxis.get_majorticklabels(), rotation=45, horizontalalignment="right")
-    plt.title("Kümülatif Oyuncular", size=18)
-    plt.plot(tp, [cumulative_players[i] for i in tp])
-
-    # Save the plot as a jpg and send it
-    plt.savefig("trends.jpg", bbox_inches="tight")
-    plt.close("all")
-    async with aiofiles.open("trends.jpg", "rb") as f:
-        await message.reply_photo(f, caption=f"Oluşturma süresi: `{time.time() - t:.3f}s`")
-    await aiofiles.os.remove("trends.jpg")
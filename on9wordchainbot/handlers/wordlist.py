@@ -144,7 +144,7 @@ async def cmd_addwords(message: types.Message) -> None:
         return
 
     t = time.time()
-    await Words.update()
+    Words.add(words_to_add)  # The base dictionary is rebuilt in the background once enough words pile up
     asyncio.create_task(
         msg.edit_text(msg.md_text + f"\n\nKelime listesi güncellendi. Geçen süre: `{time.time() - t:.3f}s`")
     )
@@ -174,6 +174,9 @@ async def cmd_rejword(message: types.Message) -> None:
                 reason.strip() or None
             )
 
+    if r is None:
+        Words.remove([word])  # Left out of the base dictionary from its next rebuild
+
     word = word.capitalize()
     if r is None:
         await message.reply(f"_{word}_ rejected.", allow_sending_without_reply=True)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+APPLICATION_NAME = "on9wordchainbot"  # Identifies the connections of bot hosts in pg_stat_activity
+LEADER_LOCK = 0x6f6e39  # Advisory lock key of the host polling updates, group ids are negative so never clash
+MAX_PAYLOAD = 7900  # NOTIFY payloads must be shorter than 8000 bytes
+OWNERS_CHANNEL = "lease_owners"  # Claims and releases are announced on it so hosts can cache owners
+OWNER_TTL = 60  # Seconds a cached owner is trusted, in case an announcement is missed
+
+
+class Leases:
+    # Ownership of games between several bot hosts sharing the database.
+    # A host owns a group while it holds a session level advisory lock keyed by the group id,
+    # all taken on one dedicated connection. If the host dies, Postgres closes the session and releases every lock,
+    # so other hosts can claim the groups again.
+    # Each host listens on a channel named after the backend pid of that connection,
+    # which is how the leader (the host holding LEADER_LOCK and polling updates) forwards updates to the owner.
+    # Claims and releases are announced to every host, which keep the owners of groups in a cache
+    # so that routing an update rarely needs a query.
+    # Without connect (a single host), every claim succeeds and nothing is forwarded.
+
+    def __init__(self) -> None:
+        self.conn: Optional[asyncpg.Connection] = None
+        self.lock = asyncio.Lock()  # One query at a time on the connection
+        self.pid: Optional[int] = None
+        self.lost = asyncio.Event()  # Set if the connection, and so every lease, is lost
+        self.node_pids: List[int] = []
+        self.node_pids_time = 0.0
+        # Advisory locks are reentrant, so each is taken once and tracked here, and one release always frees it
+        self.held: Set[int] = set()
+        self.unlocking: Dict[int, asyncio.Task] = {}  # Releases not done yet
+        self.owners: Dict[int, Tuple[Optional[int], float]] = {}  # Group id mapped to owner pid and cache time
+
+    async def connect(self, db_uri: str, on_update: Callable[[Dict[str, Any]], None]) -> None:
+        self.conn = await asyncpg.connect(db_uri, server_settings={"application_name": APPLICATION_NAME})
+        self.pid = self.conn.get_server_pid()
+        self.conn.add_termination_listener(lambda _: self.lost.set())
+        await self.conn.add_listener(
+            self.channel(self.pid), lambda _conn, _pid, _channel, payload: on_update(json.loads(payload))
+        )
+        await self.conn.add_listener(
+            OWNERS_CHANNEL, lambda _conn, _pid, _channel, payload: self.owner_changed(*json.loads(payload))
+        )
+
+    @staticmethod
+    def channel(pid: int) -> str:
+        return f"updates_{pid}"
+
+    async def fetchval(self, query: str, *args: Any) -> Any:
+        async with self.lock:
+            return await self.conn.fetchval(query, *args)
+
+    def owner_changed(self, group_id: int, pid: Optional[int]) -> None:
+        self.owners[group_id] = (pid, time.monotonic())
+
+    async def claim(self, group_id: int) -> bool:
+        # Claiming a group this host already owns succeeds
+        if group_id in self.held:
+            return True
+        if not self.conn:
+            self.held.add(group_id)
+            return True
+
+        unlocking = self.unlocking.get(group_id)
+        if unlocking:
+            await asyncio.shield(unlocking)
+        async with self.lock:
+            if group_id in self.held:  # Claimed meanwhile
+                return True
+            if not await self.conn.fetchval("SELECT pg_try_advisory_lock($1);", group_id):
+                return False
+            self.held.add(group_id)
+            await self.conn.execute("SELECT pg_notify($1, $2);", OWNERS_CHANNEL, json.dumps([group_id, self.pid]))
+        return True
+
+    def release(self, group_id: int) -> None:
+        # Takes effect for claim right away, so a game started after this keeps its lease
+        if group_id not in self.held:
+            return
+        self.held.discard(group_id)
+        if self.conn and not self.lost.is_set():
+            task = asyncio.create_task(self.unlock(group_id))
+            self.unlocking[group_id] = task
+            task.add_done_callback(lambda _: self.unlocking.pop(group_id, None))
+
+    async def unlock(self, group_id: int) -> None:
+        try:
+            async with self.lock:
+                await self.conn.fetchval("SELECT pg_advisory_unlock($1);", group_id)
+                await self.conn.execute("SELECT pg_notify($1, $2);", OWNERS_CHANNEL, json.dumps([group_id, None]))
+        except Exception:
+            logger.exception(f"Failed to release lease of group {group_id}")
+
+    async def lead(self) -> bool:
+        return await self.claim(LEADER_LOCK)
+
+    async def owner(self, group_id: int) -> Optional[int]:
+        # Backend pid of the lease connection of the host owning the group, if any
+        cached = self.owners.get(group_id)
+        if cached and time.monotonic() - cached[1] < OWNER_TTL:
+            return cached[0]
+        pid = await self.find_owner(group_id)
+        self.owners[group_id] = (pid, time.monotonic())
+        return pid
+
+    async def find_owner(self, group_id: int) -> Optional[int]:
+        # A bigint advisory lock key is split into classid (high half) and objid (low half) in pg_locks
+        return await self.fetchval(
+            """\
+            SELECT pid
+            FROM pg_locks
+            WHERE locktype = 'advisory'
+                AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+                AND classid = $1::BIGINT::OID
+                AND objid = $2::BIGINT::OID
+                AND objsubid = 1
+                AND granted;""",
+            (group_id >> 32) & 0xFFFFFFFF,
+            group_id & 0xFFFFFFFF
+        )
+
+    async def nodes(self) -> List[int]:
+        # Backend pids of the lease connections of every live host, refreshed every 10 seconds
+        if time.monotonic() - self.node_pids_time > 10:
+            async with self.lock:
+                rows = await self.conn.fetch(
+                    """\
+                    SELECT pid
+                    FROM pg_stat_activity
+                    WHERE application_name = $1 AND datname = current_database()
+                    ORDER BY pid;""",
+                    APPLICATION_NAME
+                )
+            self.node_pids = [row[0] for row in rows]
+            self.node_pids_time = time.monotonic()
+        return self.node_pids
+
+    async def route(self, group_id: int) -> int:
+        # Host to handle updates of a group: its owner, else a live host picked by group id.
+        # Both are usually cached, so this only queries the database every so often.
+        pid = await self.owner(group_id)
+        nodes = await self.nodes() or [self.pid]
+        if pid in nodes:  # Not a host that died since
+            return pid
+        return nodes[group_id % len(nodes)]
+
+    async def forward(self, pid: int, update: Dict[str, Any]) -> bool:
+        payload = json.dumps(update, ensure_ascii=False, separators=(",", ":"))
+        if len(payload.encode()) > MAX_PAYLOAD:
+            return False
+        await self.fetchval("SELECT pg_notify($1, $2);", self.channel(pid), payload)
+        return True
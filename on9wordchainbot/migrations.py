@@ -0,0 +1,122 @@
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+import asyncpg
+
+from .results import rebuild_daily_stats
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK = 0x6d6967  # Advisory lock key, group ids are negative so never clash
+
+
+async def create_aggregate_stats(conn: asyncpg.Connection) -> None:
+    # Statistics kept up to date as game results are saved, so /groupstats and /globalstats read one row,
+    # filled from the games saved so far
+    await conn.execute(
+        """\
+        CREATE TABLE IF NOT EXISTS group_player (
+            group_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            PRIMARY KEY (group_id, user_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS group_stats (
+            group_id BIGINT PRIMARY KEY,
+            player_count INTEGER NOT NULL,
+            game_count INTEGER NOT NULL,
+            word_count BIGINT NOT NULL,
+            letter_count BIGINT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS global_stats (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),  -- Only one row
+            group_count INTEGER NOT NULL,
+            player_count INTEGER NOT NULL,
+            game_count INTEGER NOT NULL,
+            word_count BIGINT NOT NULL,
+            letter_count BIGINT NOT NULL
+        );
+
+        -- Bot processes not updated yet may still be saving games
+        LOCK TABLE game IN SHARE MODE;
+
+        INSERT INTO group_player (group_id, user_id)
+            SELECT DISTINCT group_id, user_id
+                FROM gameplayer
+        ON CONFLICT DO NOTHING;
+
+        INSERT INTO group_stats (group_id, player_count, game_count, word_count, letter_count)
+            SELECT group_id, COUNT(DISTINCT user_id), COUNT(DISTINCT game_id), SUM(word_count), SUM(letter_count)
+                FROM gameplayer
+                GROUP BY group_id
+        ON CONFLICT DO NOTHING;
+
+        INSERT INTO global_stats (group_count, player_count, game_count, word_count, letter_count)
+            SELECT (SELECT COUNT(*) FROM group_stats),
+                   COUNT(*),
+                   (SELECT COUNT(*) FROM game),
+                   COALESCE(SUM(word_count), 0),
+                   COALESCE(SUM(letter_count), 0)
+                FROM player
+        ON CONFLICT DO NOTHING;"""
+    )
+
+
+async def create_daily_stats(conn: asyncpg.Connection) -> None:
+    # Daily statistics for /trend, kept up to date as game results are saved, filled from the games saved so far
+    await conn.execute(
+        """\
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day DATE PRIMARY KEY,
+            game_count INTEGER NOT NULL,
+            group_count INTEGER NOT NULL,  -- Active groups
+            player_count INTEGER NOT NULL,  -- Active players
+            new_group_count INTEGER NOT NULL,  -- Groups playing for the first time
+            new_player_count INTEGER NOT NULL  -- Players playing for the first time
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_game_mode (
+            day DATE NOT NULL,
+            game_mode TEXT NOT NULL,
+            game_count INTEGER NOT NULL,
+            PRIMARY KEY (day, game_mode)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_group (
+            day DATE NOT NULL,
+            group_id BIGINT NOT NULL,
+            PRIMARY KEY (day, group_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_player (
+            day DATE NOT NULL,
+            user_id BIGINT NOT NULL,
+            PRIMARY KEY (day, user_id)
+        );"""
+    )
+    await rebuild_daily_stats(conn)
+
+
+# Schema changes made after init.sql, applied in order to new and existing databases alike.
+# Each is applied once, so add a new one rather than change one already released.
+MIGRATIONS: List[Tuple[str, Callable[[asyncpg.Connection], Awaitable[None]]]] = [
+    ("aggregate_stats", create_aggregate_stats),
+    ("daily_stats", create_daily_stats)
+]
+
+
+async def migrate(pool: asyncpg.pool.Pool) -> None:
+    # Apply the migrations this database has not had yet, each in a transaction
+    for name, apply in MIGRATIONS:
+        async with pool.acquire() as conn, conn.transaction():
+            # Processes starting together wait for the first one to apply it
+            await conn.execute("SELECT pg_advisory_xact_lock($1);", MIGRATION_LOCK)
+            await conn.execute(
+                "CREATE TABLE IF NOT EXISTS schema_migration (name TEXT PRIMARY KEY, applied_at TIMESTAMP NOT NULL);"
+            )
+            if await conn.fetchval("SELECT TRUE FROM schema_migration WHERE name = $1;", name):
+                continue
+            logger.info(f"Applying database migration {name}")
+            await apply(conn)
+            await conn.execute("INSERT INTO schema_migration (name, applied_at) VALUES ($1, NOW());", name)
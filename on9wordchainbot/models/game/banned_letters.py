@@ -6,7 +6,9 @@ from typing import List, Optional
 from aiogram import types
 
 from .classic import ClassicGame
+from ...outbox import Priority
 from ...utils import get_random_word
+from ...words import Words
 
 
 class BannedLettersGame(ClassicGame):
@@ -31,7 +33,7 @@ class BannedLettersGame(ClassicGame):
                 f"Kalan oyuncular: {len(self.players_in_game)}/{len(self.players)}\n"
                 f"Toplam kelime: {self.turns}"
             ),
-            parse_mode=types.ParseMode.HTML
+            parse_mode=types.ParseMode.HTML, priority=Priority.TURN
         )
 
         # Reset per-turn attributes
@@ -61,21 +63,32 @@ class BannedLettersGame(ClassicGame):
             return False
         return True
 
-    def set_banned_letters(self) -> None:
-        self.banned_letters.clear()  # Mode may occur multiple times in mixed elimination
-
-        # Set banned letters (maximum one vowel)
-        if self.current_word:  # Mixed Elimination
-            alphabets = sorted(set(ascii_lowercase) - {self.current_word[-1]})
-        else:
-            alphabets = list(ascii_lowercase)
-        for _ in range(random.randint(2, 4)):
-            self.banned_letters.append(random.choice(alphabets))
-            if self.banned_letters[-1] in "aeiou":
-                alphabets = [c for c in alphabets if c not in "aeiou"]
+    def set_banned_letters(self) -> bool:
+        # Returns False if no banned letters leaving a valid answer were found,
+        # in which case no letters are banned
+        # Answers start with the last letter of the current word in mixed elimination, any letter otherwise
+        letter = self.current_word[-1] if self.current_word else None
+        for _ in range(50):
+            # Set banned letters (maximum one vowel)
+            if letter:
+                alphabets = sorted(set(ascii_lowercase) - {letter})
             else:
-                alphabets.remove(self.banned_letters[-1])
-        self.banned_letters.sort()
+                alphabets = list(ascii_lowercase)
+            banned_letters = []
+            for _ in range(random.randint(2, 4)):
+                banned_letters.append(random.choice(alphabets))
+                if banned_letters[-1] in "aeiou":
+                    alphabets = [c for c in alphabets if c not in "aeiou"]
+                else:
+                    alphabets.remove(banned_letters[-1])
+
+            if Words.index.can_avoid(letter, banned_letters, self.min_letters_limit):
+                # New list since mode may occur multiple times in mixed elimination
+                self.banned_letters = sorted(banned_letters)
+                return True
+
+        self.banned_letters = []
+        return False
 
     async def running_initialization(self) -> None:
         self.set_banned_letters()
@@ -1,9 +1,10 @@
-import random
 from datetime import datetime
 
 from aiogram import types
 
 from .classic import ClassicGame
+from .roster import Roster
+from ...outbox import Priority
 from ...utils import get_random_word
 
 
@@ -21,7 +22,7 @@ class ChaosGame(ClassicGame):
                 f"Kalan oyuncular: {len(self.players_in_game)}/{len(self.players)}\n"
                 f"Toplam kelime: {self.turns}"
             ),
-            parse_mode=types.ParseMode.HTML
+            parse_mode=types.ParseMode.HTML, priority=Priority.TURN
         )
 
         # Reset per-turn attributes
@@ -43,32 +44,45 @@ class ChaosGame(ClassicGame):
 
     async def running_phase_tick(self) -> bool:
         if self.answered:
-            # Move player who just answered to the end of queue
-            self.players_in_game.append(self.players_in_game.pop(0))
-
             # Choose random player excluding the one who just answered
-            player = self.players_in_game.pop(random.randint(0, len(self.players_in_game) - 2))
+            player = self.players_in_game.random_player(exclude=self.players_in_game[0])
+        elif not self.answer_possible():
+            # Players would run out of time one by one in random order,
+            # so end the game right away with the player who answered last as the winner,
+            # or a random survivor other than the current player if nobody answered yet
+            self.accepting_answers = False
+            await self.send_message(
+                f"<i>{self.current_word[-1].upper()}</i> ile başlayan ve en az {self.min_letters_limit} harf "
+                "içeren kullanılmamış kelime kalmadı!",
+                parse_mode=types.ParseMode.HTML
+            )
+            winner = self.players_in_game.get(self.last_answerer_id)
+            if not winner or winner is self.players_in_game[0]:
+                winner = self.players_in_game.random_player(exclude=self.players_in_game[0])
+            self.players_in_game = Roster([winner])
+            await self.handle_game_end()
+            return True
+        elif self.time_left > 0:
+            # Woken up before the turn timed out, e.g. a timer firing a little early
+            self.schedule_wakeup()
+            return False
         else:
-            self.time_left -= 1
-            if self.time_left > 0:
-                return False
-
             # Timer ran out
             self.accepting_answers = False
             await self.send_message(
                 f"{self.players_in_game[0].mention} ran out of time! They have been eliminated.",
                 parse_mode=types.ParseMode.HTML
             )
-            del self.players_in_game[0]
+            self.players_in_game.remove(self.players_in_game[0].user_id)
 
             if len(self.players_in_game) == 1:
                 await self.handle_game_end()
                 return True
 
             # Choose random player
-            player = self.players_in_game.pop(random.randint(0, len(self.players_in_game) - 1))
+            player = self.players_in_game.random_player()
 
         # Move player to start of queue
-        self.players_in_game.insert(0, player)
+        self.players_in_game.move_to_front(player)
         await self.send_turn_message()
         return False
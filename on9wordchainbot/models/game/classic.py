@@ -1,39 +1,70 @@
 import asyncio
+import logging
+import math
 import random
+import time
 from datetime import datetime
-from typing import Any, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from aiocache import cached
 from aiogram import types
-from aiogram.utils.exceptions import BadRequest
+from aiogram.utils.exceptions import BadRequest, NetworkError, TelegramAPIError
 
+from .live_panel import LivePanel
+from .roster import Roster
 from ..player import Player
-from ... import GlobalState, bot, on9bot, pool
+from ... import GlobalState, bot, checkpoints, leases, loop, on9bot, results, timer_wheel
 from ...constants import GameSettings, GameState, OWNER_ID
-from ...utils import ADD_ON9BOT_TO_GROUP_KEYBOARD, check_word_existence, get_random_word, send_admin_group
+from ...outbox import Priority, sending_priority
+from ...utils import ADD_ON9BOT_TO_GROUP_KEYBOARD, check_word_existence, get_random_word
+from ...timer_wheel import Timer
+from ...words import UsedWords
+
+logger = logging.getLogger(__name__)
+
+# Verbs announcing joins and flees, keyed by (joined, forced)
+ROSTER_CHANGE_VERBS = {
+    (True, False): "katıldı",
+    (True, True): "katılmak zorunda kaldı",
+    (False, False): "kaçtı",
+    (False, True): "kaçmak zorunda kaldı"
+}
 
 
 class ClassicGame:
     name = "classic game"
     command = "startclassic"
 
+    # Attributes only meaningful to the running process, not saved in checkpoints
+    runtime_attributes = (
+        "deadline", "wall_deadline", "timer", "wakeup", "join_lock", "pending_texts", "roster_changes", "roster_timer",
+        "roster_task", "panel"
+    )
+
     __slots__ = (
         "group_id", "players", "players_in_game", "state", "start_time", "end_time",
-        "extended_user_ids", "min_players", "max_players", "time_left", "time_limit",
-        "min_letters_limit", "current_word", "longest_word", "longest_word_sender_id",
-        "answered", "accepting_answers", "turns", "used_words", "join_lock"
+        "extended_user_ids", "min_players", "max_players", "deadline", "timer", "wakeup", "time_limit",
+        "min_letters_limit", "current_word", "longest_word", "longest_word_sender_id", "last_answerer_id",
+        "answered", "accepting_answers", "turns", "used_words", "join_lock", "pending_texts",
+        "roster_changes", "roster_timer", "roster_task", "panel", "wall_deadline"
     )
 
     def __init__(self, group_id: int) -> None:
         self.group_id = group_id
-        self.players: List[Player] = []
-        self.players_in_game: List[Player] = []
+        self.players = Roster()
+        self.players_in_game = Roster()
         self.state = GameState.JOINING
         self.start_time: Optional[datetime] = None
         self.end_time: Optional[datetime] = None
         # Store user ids rather than Player object since players may quit then join to extend again
         self.extended_user_ids: Set[int] = set()
 
+        # main_loop waits for wakeup, which is set by the timer wheel at the next deadline or reminder
+        self.deadline = loop.time()  # Event loop (monotonic) time
+        self.wall_deadline = time.time()  # Same deadline as Unix time, which is what checkpoints keep
+        self.timer: Optional[Timer] = None
+        self.wakeup = asyncio.Event()
+
         # Game settings
         self.min_players = GameSettings.MIN_PLAYERS
         self.max_players = GameSettings.MAX_PLAYERS
@@ -45,20 +76,222 @@ class ClassicGame:
         self.current_word: Optional[str] = None
         self.longest_word = ""
         self.longest_word_sender_id: Optional[int] = None  # TODO: Change to Player object instead of id
+        self.last_answerer_id: Optional[int] = None
         self.answered = False
         self.accepting_answers = False
         self.turns = 0
-        self.used_words: Set[str] = set()
+        self.used_words = UsedWords()  # Bitset over dictionary word ids
 
         self.join_lock = asyncio.Lock()  # Prevent same user / vp joining as multiple players
+        # Joins and flees not announced yet, user id mapped to (joined, forced, name)
+        self.roster_changes: Dict[int, Tuple[bool, bool, str]] = {}
+        self.roster_timer: Optional[Timer] = None
+        self.roster_task: Optional[asyncio.Task] = None
+        # Message edited to show the joining countdown, player count and the like
+        self.panel = LivePanel(group_id)
+
+        # HTML texts to be sent as part of the next game message, e.g. an accepted answer before the next turn
+        self.pending_texts: List[str] = []
+
+    @property
+    def time_left(self) -> int:
+        return max(math.ceil(self.deadline - loop.time()), 0)
+
+    @time_left.setter
+    def time_left(self, seconds: float) -> None:
+        self.deadline = loop.time() + seconds
+        self.wall_deadline = time.time() + seconds
+        self.schedule_wakeup()
+
+    def schedule_wakeup(self) -> None:
+        # Replace the timer of the game with one for the next time main_loop has something to do
+        if self.timer:
+            timer_wheel.cancel(self.timer)
+
+        when = self.deadline
+        if self.state == GameState.JOINING:
+            # Refresh the countdown on the panel at every multiple of the countdown interval
+            remaining = self.deadline - loop.time()
+            step = LivePanel.COUNTDOWN_INTERVAL
+            if remaining > step:
+                when = self.deadline - (math.ceil(remaining / step) - 1) * step
+        elif self.state == GameState.RUNNING and not self.answered and not self.answer_possible():
+            # No need to wait for the turn to time out
+            when = loop.time()
+        self.timer = timer_wheel.schedule(when, self.wakeup.set)
+
+    def kill(self) -> None:
+        self.state = GameState.KILLGAME
+        self.wakeup.set()
+
+    @classmethod
+    def checkpoint_attributes(cls) -> List[str]:
+        return [
+            name for c in reversed(cls.__mro__) for name in c.__dict__.get("__slots__", ())
+            if name not in cls.runtime_attributes
+        ]
+
+    def get_checkpoint(self) -> Dict[str, Any]:
+        # The deadline is kept rather than the time left, so the downtime of a restart counts towards it
+        state = {"class": self.__class__.__name__, "deadline_at": self.wall_deadline}
+        for name in self.checkpoint_attributes():
+            state[name] = getattr(self, name)
+        # Players are saved once, with their counters
+        state["players"] = list(self.players)
+        state["players_in_game"] = [p.user_id for p in self.players_in_game]
+        state["used_words"] = list(self.used_words)
+        return state
+
+    def checkpoint(self) -> None:
+        # Not once the game is over, when another game may have been started in the group
+        if GlobalState.games.get(self.group_id) is self:
+            checkpoints.save(self.group_id, self.get_checkpoint())
+
+    def unregister(self) -> None:
+        # Remove the game from the group along with its checkpoint and lease, if it still is the game of the group.
+        # Done before anything else is awaited so a game started in the group meanwhile is left alone.
+        if GlobalState.games.get(self.group_id) is self:
+            del GlobalState.games[self.group_id]
+            checkpoints.discard(self.group_id)
+            leases.release(self.group_id)
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        for name in self.checkpoint_attributes():
+            if name in state:
+                setattr(self, name, state[name])
+        self.players = Roster(state["players"])
+        self.players_in_game = Roster(self.players.get(user_id) for user_id in state["players_in_game"])
+        self.used_words = UsedWords()
+        for word in state["used_words"]:
+            self.used_words.add(word)
+        # Schedule the deadline only once everything it depends on is restored
+        if "deadline_at" in state:
+            self.time_left = max(state["deadline_at"] - time.time(), 0)
+        else:  # Saved by an older version
+            self.time_left = state["time_left"]
+        if self.answered:
+            # Saved before moving on to the next turn
+            self.wakeup.set()
+
+    async def send_resume_message(self) -> None:
+        # The panel message is not kept across restarts, so a new one is sent
+        if self.state == GameState.JOINING or self.answered:
+            # If the current player answered already, main_loop moves on to the next turn right away
+            await self.open_panel("Bot yeniden başlatıldı, oyun devam ediyor.")
+            return
+
+        await self.open_panel()
+        await self.send_message(
+            (
+                "Bot yeniden başlatıldı, oyun devam ediyor.\n"
+                f"Dönüş: {self.players_in_game[0].mention}, kalan süre <b>{self.time_left}s</b>."
+            ),
+            parse_mode=types.ParseMode.HTML
+        )
+        if not self.answered and self.players_in_game[0].is_vp:
+            asyncio.create_task(self.vp_answer())
+
+    def panel_text(self) -> str:
+        # To be overridden by other game modes to show more while running
+        if self.state == GameState.JOINING:
+            return (
+                f"bir{'n' if self.name[0] in 'aeiou' else ''} {self.name} başlıyor.\n"
+                f"{self.min_players}-{self.max_players} oyuncuya ihtiyaç var.\n"
+                f"Oyuncular: {len(self.players)}\n"
+                f"{self.time_left}s to /join."
+            )
+        return f"{self.name.capitalize()} başladı.\nOyuncular: {len(self.players)}"
+
+    async def open_panel(self, note: Optional[str] = None) -> None:
+        # Send buffered texts first as later edits would overwrite them
+        await self.flush_messages()
+        text = self.panel_text()
+        message = await self.send_message(
+            f"{note}\n{text}" if note else text, parse_mode=types.ParseMode.HTML
+        )
+        self.panel.attach(message, text)
+
+    def update_panel(self) -> None:
+        self.panel.update(self.panel_text())
 
     def user_in_game(self, user_id: int) -> bool:
-        return any(p.user_id == user_id for p in self.players)
+        return self.players.get(user_id) is not None
+
+    async def send_message(
+        self, text: str, *args: Any, priority: Priority = Priority.GAME, **kwargs: Any
+    ) -> types.Message:
+        # Buffered texts wait for a game message rather than go out with chatter,
+        # which may be queued behind the next turn message
+        if self.pending_texts and priority <= Priority.GAME:
+            if kwargs.get("parse_mode") == types.ParseMode.HTML:
+                # Prepend buffered texts to save an API call
+                text = "\n\n".join(self.pending_texts + [text])
+                self.pending_texts.clear()
+            else:
+                await self.flush_messages(priority)
+
+        with sending_priority(priority):
+            return await bot.send_message(
+                self.group_id, text, *args, disable_web_page_preview=True,
+                allow_sending_without_reply=True, **kwargs
+            )
 
-    async def send_message(self, *args: Any, **kwargs: Any) -> types.Message:
-        return await bot.send_message(
-            self.group_id, *args, disable_web_page_preview=True,
-            allow_sending_without_reply=True, **kwargs
+    def buffer_message(self, text: str) -> None:
+        # Send HTML text along with the next game message rather than on its own
+        self.pending_texts.append(text.strip("\n"))
+
+    async def flush_messages(self, priority: Priority = Priority.GAME) -> None:
+        # At the priority of the message following, so that they are not overtaken by it
+        if self.pending_texts:
+            text = "\n\n".join(self.pending_texts)
+            self.pending_texts.clear()
+            await self.send_message(text, parse_mode=types.ParseMode.HTML, priority=priority)
+
+    def announce_roster_change(self, player: Player, joined: bool, forced: bool = False) -> None:
+        # Joins and flees are announced together a few seconds after the first one,
+        # so that a crowd joining does not use up the message limit of the group.
+        # Joining then fleeing (or the other way round) meanwhile cancels out.
+        self.update_panel()
+        change = self.roster_changes.pop(player.user_id, None)
+        if change and change[0] != joined:
+            return
+        self.roster_changes[player.user_id] = (joined, forced, player.name)
+        if not self.roster_timer:
+            self.roster_timer = timer_wheel.schedule(
+                loop.time() + GameSettings.ROSTER_ANNOUNCEMENT_DELAY,
+                self.start_roster_announcement
+            )
+
+    def start_roster_announcement(self) -> None:
+        self.roster_task = asyncio.create_task(self.announce_roster_changes())
+
+    async def announce_roster_changes(self) -> None:
+        try:
+            await self.send_roster_changes()
+        except (NetworkError, asyncio.TimeoutError):
+            logger.warning(f"Failed to announce roster changes in group {self.group_id}")
+        except TelegramAPIError:
+            # E.g. the bot was kicked, the next game message fails as well and ends the game
+            logger.exception(f"Failed to announce roster changes in group {self.group_id}")
+
+    async def send_roster_changes(self) -> None:
+        if self.roster_timer:
+            timer_wheel.cancel(self.roster_timer)
+            self.roster_timer = None
+        if not self.roster_changes:
+            return
+
+        names: Dict[Tuple[bool, bool], List[str]] = {}
+        for joined, forced, name in self.roster_changes.values():
+            names.setdefault((joined, forced), []).append(name)
+        self.roster_changes.clear()
+
+        text = "".join(
+            f"{', '.join(names[change])} {verb}.\n" for change, verb in ROSTER_CHANGE_VERBS.items() if change in names
+        )
+        await self.send_message(
+            text + f"Şimdi {len(self.players)} oyuncu var.",
+            parse_mode=types.ParseMode.HTML, priority=Priority.CHATTER
         )
 
     @cached(ttl=15)
@@ -71,9 +304,8 @@ class ClassicGame:
             if self.state != GameState.JOINING or len(self.players) >= self.max_players:
                 return
 
-            # Try to detect game not starting
-            if self.time_left < 0:
-                asyncio.create_task(self.scan_for_stale_timer())
+            # Joining phase is over, main_loop is starting the game
+            if self.time_left == 0:
                 return
 
             # Check if user already joined
@@ -83,12 +315,8 @@ class ClassicGame:
 
             player = await Player.create(user)
             self.players.append(player)
-
-            await self.send_message(
-                f"{player.name} katıldı. Şimdi {'is' if len(self.players) == 1 else 'are'} var "
-                f"{len(self.players)} oyuncu{'' if len(self.players) == 1 else 's'}.",
-                parse_mode=types.ParseMode.HTML
-            )
+            self.checkpoint()
+            self.announce_roster_change(player, joined=True)
 
             # Start game when max players reached
             if len(self.players) >= self.max_players:
@@ -112,36 +340,27 @@ class ClassicGame:
             self.players.append(player)
             if self.state == GameState.RUNNING:
                 self.players_in_game.append(player)
-
-            await self.send_message(
-                f"{player.name} katılmak zorunda kaldı. Şimdi {'is' if len(self.players) == 1 else 'are'} var "
-                f"{len(self.players)} oyuncu{'' if len(self.players) == 1 else 's'}.",
-                parse_mode=types.ParseMode.HTML
-            )
+            self.checkpoint()
+            self.announce_roster_change(player, joined=True, forced=True)
 
             # Start game when max players reached
             if len(self.players) >= self.max_players:
                 self.time_left = -99999
 
+        if self.state == GameState.RUNNING:
+            # Only joins and flees in the joining phase are collected
+            await self.send_roster_changes()
+
     async def flee(self, message: types.Message) -> None:
         async with self.join_lock:
             if self.state != GameState.JOINING:
                 return
 
-            # Find player to remove
-            user_id = message.from_user.id
-            for i in range(len(self.players)):
-                if self.players[i].user_id == user_id:
-                    player = self.players.pop(i)
-                    break
-            else:
+            player = self.players.remove(message.from_user.id)
+            if not player:
                 return
-
-            await self.send_message(
-                f"{player.name} kaçtı. Şimdi {'is' if len(self.players) == 1 else 'are'} var "
-                f"{len(self.players)} oyuncu{'' if len(self.players) == 1 else 's'}.",
-                parse_mode=types.ParseMode.HTML
-            )
+            self.checkpoint()
+            self.announce_roster_change(player, joined=False)
 
     async def forceflee(self, message: types.Message) -> None:
         async with self.join_lock:
@@ -149,20 +368,11 @@ class ClassicGame:
             if self.state != GameState.JOINING or not message.reply_to_message:
                 return
 
-            # Find player to remove
-            user_id = message.reply_to_message.from_user.id
-            for i in range(len(self.players)):
-                if self.players[i].user_id == user_id:
-                    player = self.players.pop(i)
-                    break
-            else:
+            player = self.players.remove(message.reply_to_message.from_user.id)
+            if not player:
                 return
-
-            await self.send_message(
-                f"{player.name} kaçmak zorunda kaldı. Şimdi {'is' if len(self.players) == 1 else 'are'} var "
-                f"{len(self.players)} oyuncu{'' if len(self.players) == 1 else 's'}.",
-                parse_mode=types.ParseMode.HTML
-            )
+            self.checkpoint()
+            self.announce_roster_change(player, joined=False, forced=True)
 
     async def addvp(self, message: types.Message) -> None:
         async with self.join_lock:
@@ -170,7 +380,7 @@ class ClassicGame:
                 return
 
             # Check if On9Bot already joined
-            if any(p.is_vp for p in self.players):
+            if self.user_in_game(on9bot.id):
                 return
 
             # Check if vp adder is player/admin/owner
@@ -195,27 +405,23 @@ class ClassicGame:
 
             vp = await Player.vp()
             self.players.append(vp)
-
-            await on9bot.send_message(self.group_id, "/join@" + (await bot.me).username)
-            await self.send_message(
-                (
-                    f"{vp.name} katıldı. Şimdi {'is' if len(self.players) == 1 else 'are'} var "
-                    f"{len(self.players)} oyuncu{'' if len(self.players) == 1 else 's'}."
-                ),
-                parse_mode=types.ParseMode.HTML
-            )
+            self.checkpoint()
+            self.announce_roster_change(vp, joined=True)
 
             # Start game when max players reached
             if len(self.players) >= self.max_players:
                 self.time_left = -99999
 
+        with sending_priority(Priority.CHATTER):
+            await on9bot.send_message(self.group_id, "/join@" + (await bot.me).username)
+
     async def remvp(self, message: types.Message) -> None:
         async with self.join_lock:
             if self.state != GameState.JOINING:
                 return
 
             # Check if On9Bot has joined
-            if not any(p.is_vp for p in self.players):
+            if not self.user_in_game(on9bot.id):
                 return
 
             # Check if vp remover is player/admin
@@ -227,21 +433,14 @@ class ClassicGame:
                 await self.send_message("Imagine not playing")
                 return
 
-            for i in range(len(self.players)):
-                if self.players[i].is_vp:
-                    vp = self.players.pop(i)
-                    break
-            else:
+            vp = self.players.remove(on9bot.id)
+            if not vp:
                 return
+            self.checkpoint()
+            self.announce_roster_change(vp, joined=False)
 
+        with sending_priority(Priority.CHATTER):
             await on9bot.send_message(self.group_id, "/flee@" + (await bot.me).username)
-            await self.send_message(
-                (
-                    f"{vp.name} kaçtı. Şimdi {'is' if len(self.players) == 1 else 'are'} var "
-                    f"{len(self.players)} oyuncu{'' if len(self.players) == 1 else 's'}."
-                ),
-                parse_mode=types.ParseMode.HTML
-            )
 
     async def extend(self, message: types.Message) -> None:
         if self.state != GameState.JOINING:
@@ -287,6 +486,8 @@ class ClassicGame:
                 self.time_left = -99999
             else:
                 self.time_left -= n
+                self.checkpoint()
+                self.update_panel()
                 await self.send_message(
                     f"Birleştirme aşaması {n}s azaltıldı.\n"
                     f"{self.time_left} hakkınız var /join."
@@ -296,6 +497,8 @@ class ClassicGame:
             # Max joining phase duration is capped
             added_duration = min(n, GameSettings.MAX_JOINING_PHASE_SECONDS - self.time_left)
             self.time_left += added_duration
+            self.checkpoint()
+            self.update_panel()
             await self.send_message(
                 f"The joining phase has been extended by {added_duration}s.\n"
                 f"You have {self.time_left}s to /join."
@@ -311,7 +514,7 @@ class ClassicGame:
                 f"Kalan oyuncular: {len(self.players_in_game)}/{len(self.players)}\n"
                 f"Toplam kelime: {self.turns}"
             ),
-            parse_mode=types.ParseMode.HTML
+            parse_mode=types.ParseMode.HTML, priority=Priority.TURN
         )
 
         # Reset per-turn attributes
@@ -329,22 +532,27 @@ class ClassicGame:
             exclude_words=self.used_words
         )
 
+    def answer_possible(self) -> bool:
+        # False if no unused word has the required first letter and length.
+        # Nothing changes these until an answer is accepted, so the game is then stuck for every player.
+        return self.used_words.remaining(self.current_word[-1], self.min_letters_limit) > 0
+
     async def vp_answer(self) -> None:
-        # Wait before answering to prevent exceeding 20 msg/min message limit
-        # Also simulate thinking/input time like human players, wowzers
-        await asyncio.sleep(random.uniform(5, 8))
+        # Simulate thinking/input time like human players, wowzers
+        # Message limits are kept by the outbox
+        await asyncio.sleep(random.uniform(1, 3))
 
-        word = self.get_random_valid_answer()
+        word = self.get_random_valid_answer() if self.answer_possible() else None
 
-        if not word:  # No valid words to choose from
-            await on9bot.send_message(self.group_id, "/forceskip bey")
-            self.time_left = 0
-            return
+        with sending_priority(Priority.TURN):
+            if not word:  # No valid words to choose from
+                await on9bot.send_message(self.group_id, "/forceskip bey")
+                self.time_left = 0
+                return
 
-        await on9bot.send_message(self.group_id, word.capitalize())
+            await on9bot.send_message(self.group_id, word.capitalize())
 
-        self.post_turn_processing(word)
-        await self.send_post_turn_message(word)
+        await self.handle_accepted_answer(word)
 
     async def additional_answer_checkers(self, word: str, message: types.Message) -> bool:
         # To be overridden by other game modes
@@ -383,8 +591,16 @@ class ClassicGame:
         if not await self.additional_answer_checkers(word, message):
             return
 
-        self.post_turn_processing(word)
-        await self.send_post_turn_message(word)
+        await self.handle_accepted_answer(word)
+
+    async def handle_accepted_answer(self, word: str) -> None:
+        try:
+            self.post_turn_processing(word)
+            self.checkpoint()
+            await self.send_post_turn_message(word)
+        finally:
+            # Start the next turn right away rather than at the turn deadline
+            self.wakeup.set()
 
     def post_turn_processing(self, word: str) -> None:
         # Prevent circular imports
@@ -406,30 +622,32 @@ class ClassicGame:
         if len(word) > len(self.longest_word):
             self.longest_word = word
             self.longest_word_sender_id = self.players_in_game[0].user_id
+        self.last_answerer_id = self.players_in_game[0].user_id
 
         # Set per-turn attributes
         self.answered = True
         self.accepting_answers = False
 
     async def send_post_turn_message(self, word: str) -> None:
-        text = f"_{word.capitalize()}_ kabul edilir.\n\n"
+        # Buffered since the next turn message follows right away
+        text = f"<i>{word.capitalize()}</i> kabul edilir.\n\n"
         # Reduce limits if possible every set number of turns
         if self.turns % GameSettings.TURNS_BETWEEN_LIMITS_CHANGE == 0:
             if self.time_limit > GameSettings.MIN_TURN_SECONDS:
                 self.time_limit -= GameSettings.TURN_SECONDS_REDUCTION_PER_LIMIT_CHANGE
                 text += (
                     f"Zaman sınırı düşürüldü "
-                    f"*{self.time_limit + GameSettings.TURN_SECONDS_REDUCTION_PER_LIMIT_CHANGE} sn* "
-                    f"*{self.time_limit}s* kadar.\n"
+                    f"<b>{self.time_limit + GameSettings.TURN_SECONDS_REDUCTION_PER_LIMIT_CHANGE} sn</b> "
+                    f"<b>{self.time_limit}s</b> kadar.\n"
                 )
             if self.min_letters_limit < GameSettings.MAX_WORD_LENGTH_LIMIT:
                 self.min_letters_limit += GameSettings.WORD_LENGTH_LIMIT_INCREASE_PER_LIMIT_CHANGE
                 text += (
                     f"Kelime başına minimum harf arttı "
-                    f"*{self.min_letters_limit - GameSettings.WORD_LENGTH_LIMIT_INCREASE_PER_LIMIT_CHANGE}* "
-                    f"*{self.min_letters_limit}* kadar.\n"
+                    f"<b>{self.min_letters_limit - GameSettings.WORD_LENGTH_LIMIT_INCREASE_PER_LIMIT_CHANGE}</b> "
+                    f"<b>{self.min_letters_limit}</b> kadar.\n"
                 )
-        await self.send_message(text)
+        self.buffer_message(text)
 
     async def running_initialization(self) -> None:
         # Random starting word
@@ -452,19 +670,34 @@ class ClassicGame:
         # False: Game is still ongoing
         if self.answered:
             # Move player who just answered to the end of queue
-            self.players_in_game.append(self.players_in_game.pop(0))
+            self.players_in_game.rotate()
+        elif not self.answer_possible():
+            # Every remaining player would run out of time in turn,
+            # so end the game right away with the player who answered last as the winner
+            self.accepting_answers = False
+            await self.send_message(
+                f"<i>{self.current_word[-1].upper()}</i> ile başlayan ve en az {self.min_letters_limit} harf "
+                "içeren kullanılmamış kelime kalmadı!",
+                parse_mode=types.ParseMode.HTML
+            )
+            # Players joining midgame are put at the end of the queue, so that is not always who answered last.
+            # If nobody answered yet, the last in the queue is who would be left.
+            winner = self.players_in_game.get(self.last_answerer_id)
+            self.players_in_game = Roster([winner or self.players_in_game[-1]])
+            await self.handle_game_end()
+            return True
+        elif self.time_left > 0:
+            # Woken up before the turn timed out, e.g. a timer firing a little early
+            self.schedule_wakeup()
+            return False
         else:
-            self.time_left -= 1
-            if self.time_left > 0:
-                return False
-
             # Timer ran out
             self.accepting_answers = False
             await self.send_message(
                 f"{self.players_in_game[0].mention} süresi doldu! elendiler.",
                 parse_mode=types.ParseMode.HTML
             )
-            del self.players_in_game[0]
+            self.players_in_game.remove(self.players_in_game[0].user_id)
 
             if len(self.players_in_game) == 1:
                 await self.handle_game_end()
@@ -483,150 +716,72 @@ class ClassicGame:
         text = f"{kazanan}, {len(self.players)} oyuncu arasından oyunu kazandı!\n"
         text += f"Toplam kelime: {self.turns}\n"
         if self.longest_word:
-            longest_word_sender_name = [p for p in self.players if p.user_id == self.longest_word_sender_id][0].name
+            longest_word_sender_name = self.players.get(self.longest_word_sender_id).name
             text += f"En uzun kelime: <i>{self.longest_word.capitalize()}</i> from {longest_word_sender_name}\n"
         text += f"Oyun uzunluğu: <code>{game_len_str}</code>"
         await self.send_message(text, parse_mode=types.ParseMode.HTML)
 
-        GlobalState.games.pop(self.group_id, None)
-
-    async def update_db(self) -> None:
-        async with pool.acquire() as conn:
-            # Insert game instance
-            await conn.execute(
-                """\
-                INSERT INTO game (group_id, players, game_mode, winner, start_time, end_time)
-                    VALUES ($1, $2, $3, $4, $5, $6);""",
-                self.group_id,
-                len(self.players),
-                self.__class__.__name__,
-                self.players_in_game[0].user_id if self.players_in_game else None,
-                self.start_time,
-                self.end_time
-            )
-            # Get game id
-            game_id = await conn.fetchval(
-                "SELECT id FROM game WHERE group_id = $1 AND start_time = $2;",
-                self.group_id,
-                self.start_time
-            )
-        for player in self.players:  # Update db players in parallel
-            asyncio.create_task(self.update_db_player(game_id, player))
-
-    async def update_db_player(self, game_id: int, player: Player) -> None:
-        async with pool.acquire() as conn:
-            player_exists = bool(await conn.fetchval("SELECT id FROM player WHERE user_id = $1;", player.user_id))
-            if player_exists:  # Update player in db
-                await conn.execute(
-                    """\
-                    UPDATE player
-                    SET game_count = game_count + 1,
-                        win_count = win_count + $1,
-                        word_count = word_count + $2,
-                        letter_count = letter_count + $3,
-                        longest_word = CASE WHEN longest_word IS NULL THEN $4::TEXT
-                                            WHEN $4::TEXT IS NULL THEN longest_word
-                                            WHEN LENGTH($4::TEXT) > LENGTH(longest_word) THEN $4::TEXT
-                                            ELSE longest_word
-                                       END
-                    WHERE user_id = $5;""",
-                    int(player in self.players_in_game),  # Support no winner in some game modes
-                    player.word_count,
-                    player.letter_count,
-                    player.longest_word or None,
-                    player.user_id
-                )
-            else:  # New player, create player in db
-                await conn.execute(
-                    """\
-                    INSERT INTO player (user_id, game_count, win_count, word_count, letter_count, longest_word)
-                        VALUES ($1, 1, $2, $3, $4, $5::TEXT);""",
-                    player.user_id,
-                    int(player in self.players_in_game),  # No winner in some game modes
-                    player.word_count,
-                    player.letter_count,
-                    player.longest_word or None
-                )
-
-            # Create gameplayer in db
-            await conn.execute(
-                """\
-                INSERT INTO gameplayer (user_id, group_id, game_id, won, word_count, letter_count, longest_word)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7);""",
-                player.user_id,
-                self.group_id,
-                game_id,
-                player in self.players_in_game,
-                player.word_count,
-                player.letter_count,
-                player.longest_word or None
-            )
-
-    async def scan_for_stale_timer(self) -> None:
-        # Check if game timer is stuck
-        timer = self.time_left
-        for _ in range(5):
-            await asyncio.sleep(1)
-            if timer != self.time_left and timer >= 0:
-                return  # Timer not stuck
-            if self.state == GameState.KILLGAME or self.group_id not in GlobalState.games:
-                return  # Game already killed
-
-        await send_admin_group(f""{self.group_id}" grubunda uzun süreli eski/negatif zamanlayıcı algılandı. Oyun sonlandırıldı.")
-        try:
-            await self.send_message("Oyun zamanlayıcısı arızalı. Oyun sonlandırıldı.")
-        except:
-            pass
-
-        GlobalState.games.pop(self.group_id, None)
-
-    async def main_loop(self, message: types.Message) -> None:
-        # Attempt to fix issue of stuck game with negative timer.
-        negative_timer = 0
+        self.unregister()
+
+    def update_db(self) -> None:
+        # Saved to the database in the background, see ResultSpool
+        results.append({
+            "group_id": self.group_id,
+            "game_mode": self.__class__.__name__,
+            "winner": self.players_in_game[0].user_id if self.players_in_game else None,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            # No winner in some game modes
+            "players": [
+                (p.user_id, p in self.players_in_game, p.word_count, p.letter_count, p.longest_word or None)
+                for p in self.players
+            ]
+        })
+
+    async def main_loop(self, message: Optional[types.Message] = None) -> None:
+        # No message if the game is resumed from a checkpoint
         try:
-            await self.send_message(
-                f"bir{'n' if self.name[0] in 'aeiou' else ''} {self.name} başlıyor.\n"
-                f"{self.min_players}-{self.max_players} oyuncuya ihtiyaç var.\n"
-                f"{self.time_left}s to /join."
-            )
-            await self.join(message)
+            if message:
+                await self.open_panel()
+                await self.join(message)
+            else:
+                await self.send_resume_message()
 
             while True:
-                await asyncio.sleep(1)
+                await self.wakeup.wait()
+                self.wakeup.clear()
                 if self.state == GameState.JOINING:
                     if self.time_left > 0:
-                        self.time_left -= 1
-                        if self.time_left in (15, 30, 60):
-                            await self.send_message(f"{self.time_left} sn kaldı /join.")
+                        # Countdown on the panel, nothing to save
+                        self.update_panel()
+                        self.schedule_wakeup()
+                        continue
                     elif len(self.players) < self.min_players:
+                        await self.send_roster_changes()
                         await self.send_message("Yeterli değil.")
-                        del GlobalState.games[self.group_id]
+                        self.unregister()
                         return
                     else:
+                        await self.send_roster_changes()
                         self.state = GameState.RUNNING
                         await self.send_message("Oyun başlıyor...")
 
-                        random.shuffle(self.players)
-                        self.players_in_game = self.players[:]
+                        self.players_in_game = Roster(random.sample(list(self.players), len(self.players)))
 
                         await self.running_initialization()
+                        self.update_panel()
                         await self.send_turn_message()
                 elif self.state == GameState.RUNNING:
-                    # Check for prolonged negative timer
-                    if self.time_left < 0:
-                        negative_timer += 1
-                    if negative_timer >= 5:
-                        raise ValueError("Uzun süreli negatif zamanlayıcı.")
-
                     if await self.running_phase_tick():  # True: Game ended
-                        await self.update_db()
+                        self.update_db()
                         return
                 elif self.state == GameState.KILLGAME:
                     await self.send_message("Game ended forcibly.")
-                    GlobalState.games.pop(self.group_id, None)
+                    self.unregister()
                     return
+                self.checkpoint()
         except Exception as e:
-            GlobalState.games.pop(self.group_id, None)
+            self.unregister()
             try:
                 await self.send_message(
                     f"Oyun şu hata nedeniyle sona erdi:\n`{e.__class__.__name__}: {e}`.\n"
@@ -635,3 +790,10 @@ class ClassicGame:
             except:
                 pass
             raise
+        finally:
+            if self.timer:
+                timer_wheel.cancel(self.timer)
+            if self.roster_timer:
+                timer_wheel.cancel(self.roster_timer)
+            # The checkpoint and lease are kept if the game is still on, i.e. the bot is shutting down
+            self.panel.close()
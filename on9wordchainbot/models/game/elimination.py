@@ -1,11 +1,13 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from aiogram import types
 
 from .classic import ClassicGame
+from .leaderboard import Leaderboard
 from ..player import Player
 from ...constants import GameSettings, GameState
+from ...outbox import Priority
 from ...utils import get_random_word
 
 
@@ -13,7 +15,9 @@ class EliminationGame(ClassicGame):
     name = "elimination game"
     command = "startelim"
 
-    __slots__ = ("round", "turns_until_elimination", "exceeded_score_limit")
+    runtime_attributes = ClassicGame.runtime_attributes + ("leaderboard",)
+
+    __slots__ = ("round", "turns_until_elimination", "exceeded_score_limit", "leaderboard")
 
     def __init__(self, group_id: int) -> None:
         super().__init__(group_id)
@@ -31,6 +35,7 @@ class EliminationGame(ClassicGame):
         self.round = 1
         self.turns_until_elimination = 0
         self.exceeded_score_limit = False  # Remind players that there is a turn score increment ceiling
+        self.leaderboard = Leaderboard()  # Players in game ranked by score, filled once the game starts
 
     async def forcejoin(self, message: types.Message) -> None:
         # Joining in the middle of an elimination game puts one at a disadvantage since points are cumulative
@@ -38,56 +43,46 @@ class EliminationGame(ClassicGame):
         if self.state == GameState.JOINING:
             await super().forcejoin(message)
 
-    def get_leaderboard(self, show_player: Optional[Player] = None) -> str:
-        # nightmare nightmare nightmare nightmare
+    def restore(self, state: Dict[str, Any]) -> None:
+        super().restore(state)
+        self.leaderboard = Leaderboard(self.players_in_game)
+
+    def panel_text(self) -> str:
+        if self.state != GameState.RUNNING:
+            return super().panel_text()
+        return (
+            f"{self.round}. tur\n"
+            f"Kalan oyuncular: {len(self.players_in_game)}/{len(self.players)}\n\n"
+            "Skor tablosu:\n" + self.get_leaderboard()
+        )
 
-        # Make a copy of players in game
-        players = self.players_in_game[:]
-        # Sort by letter count descending then user id ascending
-        # The user id part is to ensure consistent ordering of players with same letter count
-        players.sort(key=lambda k: (-k.score, k.user_id))
-        text = ""
+    def get_leaderboard(self, show_player: Optional[Player] = None) -> str:
+        def line(rank: int, p: Player) -> str:
+            return f"{'> ' if p is show_player else ''}{rank}. {p.name}: {p.score}"
 
-        if not show_player:
+        players = self.leaderboard
+        if not show_player or len(players) <= 10:
             # Show every player
-            for i, p in enumerate(players, start=1):
-                text += f"{i}. {p.name}: {p.score}\n"
-            return text.rstrip()
+            return "\n".join(line(i, p) for i, p in enumerate(players, start=1))
 
         # Highlight player (while showing 10 other players at max)
-        if len(players) <= 10:
-            # Show every player
-            for i, p in enumerate(players, start=1):
-                line = f"{i}. {p.name}: {p.score}\n"
-                if p is show_player:
-                    line = "> " + line
-                text += line
-        elif players.index(show_player) <= 4 or players.index(show_player) >= len(players) - 5:
-            # Player is in first or last 5 places, show those places
-            for i, p in enumerate(players[:5], start=1):
-                line = f"{i}. {p.name}: {p.score}\n"
-                if p is show_player:
-                    line = "> " + line
-                text += line
-            text += "...\n"
-            for i, p in enumerate(players[-5:], start=len(players) - 4):
-                line = f"{i}. {p.name}: {p.score}\n"
-                if p is show_player:
-                    line = "> " + line
-                text += line
-        else:
-            # Player not in first or last 5 places, show player in middle
-            for i, p in enumerate(players[:5], start=1):
-                text += f"{i}. {p.name}: {p.score}\n"
+        # First and last 5 places, with the player in between if not in either
+        index = players.index(show_player)
+        lines = [line(i, p) for i, p in enumerate(players.islice(0, 5), start=1)]
+        if 5 <= index < len(players) - 5:
             # Prevent unnecessary ellipses if player is 6th place from top or bottom
-            if players[5] is not show_player:
-                text += "...\n"
-            text += f"> {players.index(show_player) + 1}. {show_player.name}: {show_player.score}\n"
-            if players[-6] is not show_player:
-                text += "...\n"
-            for i, p in enumerate(players[-5:], start=len(players) - 4):
-                text += f"{i}. {p.name}: {p.score}\n"
-        return text.rstrip()
+            if index > 5:
+                lines.append("...")
+            lines.append(line(index + 1, show_player))
+            if index < len(players) - 6:
+                lines.append("...")
+        else:
+            lines.append("...")
+        lines.extend(
+            line(i, p)
+            for i, p in enumerate(players.islice(len(players) - 5, len(players)), start=len(players) - 4)
+        )
+        return "\n".join(lines)
 
     async def send_turn_message(self) -> None:
         await self.send_message(
@@ -100,7 +95,7 @@ class EliminationGame(ClassicGame):
                   f"Yanıtlamanız gereken <b>{self.time_limit}s</b> süreniz var.\n\n"
                   "Liderler Sıralaması:\n" + self.get_leaderboard(show_player=self.players_in_game[0])
             ),
-            parse_mode=types.ParseMode.HTML
+            parse_mode=types.ParseMode.HTML, priority=Priority.TURN
         )
 
         # Reset per-turn attributes
@@ -110,19 +105,21 @@ class EliminationGame(ClassicGame):
 
     def post_turn_processing(self, word: str) -> None:
         super().post_turn_processing(word)
-        self.players_in_game[0].score += min(len(word), GameSettings.ELIM_MAX_TURN_SCORE)
+        self.leaderboard.add_score(self.players_in_game[0], min(len(word), GameSettings.ELIM_MAX_TURN_SCORE))
         if len(word) > GameSettings.ELIM_MAX_TURN_SCORE:
             self.exceeded_score_limit = True
 
     async def send_post_turn_message(self, word: str) -> None:
-        text = f"_{word.capitalize()}_ is accepted."
+        text = f"<i>{word.capitalize()}</i> is accepted."
         if self.exceeded_score_limit:
             text += f"\nBu uzun bir kelime! Yalnızca {GameSettings.ELIM_MAX_TURN_SCORE} puan için sayılır."
             self.exceeded_score_limit = False
-        await self.send_message(text)
+        self.buffer_message(text)
         # No limit reduction
 
     async def running_initialization(self) -> None:
+        self.leaderboard = Leaderboard(self.players_in_game)
+
         # Random starting word
         self.current_word = get_random_word()
         self.used_words.add(self.current_word)
@@ -140,9 +137,19 @@ class EliminationGame(ClassicGame):
         await self.handle_round_start()
 
     async def running_phase_tick(self) -> bool:
+        if not self.answered and not self.answer_possible():
+            # No one can score anymore, so play out the remaining round ends right away
+            self.accepting_answers = False
+            await self.send_message("Kullanılabilecek kelime kalmadı!")
+            while len(self.players_in_game) > 1:
+                await self.handle_round_end()
+            await self.handle_game_end()
+            return True
+
         if not self.answered:
-            self.time_left -= 1
             if self.time_left > 0:
+                # Woken up before the turn timed out, e.g. a timer firing a little early
+                self.schedule_wakeup()
                 return False
             self.accepting_answers = False
             await self.send_message(
@@ -153,7 +160,7 @@ class EliminationGame(ClassicGame):
         # Regardless of answering in time or running out of time
         # Elimination happens at the end of the round
         # Move player who just answered to the end of queue
-        self.players_in_game.append(self.players_in_game.pop(0))
+        self.players_in_game.rotate()
         self.turns_until_elimination -= 1
 
         # Handle round transition
@@ -172,31 +179,28 @@ class EliminationGame(ClassicGame):
     async def handle_round_start(self) -> None:
         self.turns_until_elimination = len(self.players_in_game)
 
-        await self.send_message(
-            f"{self.round} turu başlıyor...\n\nSkor tablosu:\n" + self.get_leaderboard(),
-            parse_mode=types.ParseMode.HTML
-        )
+        # Sent with the first turn message of the round, the leaderboard is kept on the panel
+        self.buffer_message(f"{self.round} turu başlıyor...")
+        self.update_panel()
 
     async def handle_round_end(self) -> None:
         # Eliminate player(s) with lowest score
         # Hence the possibility of no winners
-        min_score = min(p.score for p in self.players_in_game)
-        eliminated = [p for p in self.players_in_game if p.score == min_score]
-
-        await self.send_message(
-            (
-                f"Round {self.round} completed.\n\nLeaderboard:\n"
-                + self.get_leaderboard()
-                + "\n\n"
-                + ", ".join(p.mention for p in eliminated)
-                + " "
-                + ("is" if len(elendi) == 1 else "are")
-                + f" {min_score} ile en düşük puana sahip olduğu için elendi."
-            ),
-            parse_mode=types.ParseMode.HTML
+        eliminated = self.leaderboard.lowest()
+        min_score = eliminated[0].score
+
+        # Sent with the next round start or game end message
+        self.buffer_message(
+            f"Round {self.round} completed.\n"
+            + ", ".join(p.mention for p in eliminated)
+            + " "
+            + ("is" if len(eliminated) == 1 else "are")
+            + f" {min_score} ile en düşük puana sahip olduğu için elendi."
         )
 
         # Update attributes
-        self.players_in_game = [p for p in self.players_in_game if p not in eliminated]
+        for p in eliminated:
+            self.players_in_game.remove(p.user_id)
+            self.leaderboard.remove(p)
         self.round += 1
         self.turns_until_elimination = len(self.players_in_game)
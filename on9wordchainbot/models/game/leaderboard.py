@@ -0,0 +1,51 @@
+from typing import Iterable, Iterator, List, Tuple
+
+from sortedcontainers import SortedKeyList
+
+from ..player import Player
+
+
+def ranking_key(player: Player) -> Tuple[int, int]:
+    # Sort by score descending then user id ascending
+    # The user id part is to ensure consistent ordering of players with same score
+    return -player.score, player.user_id
+
+
+class Leaderboard:
+    # Players in game kept ranked as scores change, so that ranks and windows are O(log n + k)
+    # Scores must only be changed through add_score since the order depends on them
+
+    __slots__ = ("players",)
+
+    def __init__(self, players: Iterable[Player] = ()) -> None:
+        self.players = SortedKeyList(players, key=ranking_key)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self.players)
+
+    def index(self, player: Player) -> int:
+        return self.players.index(player)
+
+    def islice(self, start: int, stop: int) -> Iterator[Player]:
+        return self.players.islice(start, stop)
+
+    def add(self, player: Player) -> None:
+        self.players.add(player)
+
+    def remove(self, player: Player) -> None:
+        self.players.remove(player)
+
+    def add_score(self, player: Player, points: int) -> None:
+        self.players.remove(player)
+        player.score += points
+        self.players.add(player)
+
+    def lowest(self) -> List[Player]:
+        # Every player with the lowest score
+        if not self.players:
+            return []
+        start = self.players.bisect_key_left((-self.players[-1].score, float("-inf")))
+        return list(self.players.islice(start))
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import types
+from aiogram.utils.exceptions import (
+    MessageCantBeEdited, MessageNotModified, MessageToEditNotFound, NetworkError, RetryAfter, TelegramAPIError,
+    Unauthorized
+)
+
+from ... import bot, loop, timer_wheel
+from ...outbox import Priority, sending_priority
+from ...timer_wheel import Timer
+
+logger = logging.getLogger(__name__)
+
+
+class LivePanel:
+    # A game message kept up to date by editing it instead of sending new messages.
+    # Edits count towards the message limit of the group as well, so there is at most one every EDIT_INTERVAL seconds.
+    # Updates in between replace each other and only the latest text is shown.
+    # Countdowns on the panel are only refreshed every COUNTDOWN_INTERVAL seconds, see ClassicGame.schedule_wakeup.
+
+    EDIT_INTERVAL = 10
+    COUNTDOWN_INTERVAL = 30
+
+    __slots__ = ("group_id", "message_id", "text", "shown_text", "edited_at", "timer", "task")
+
+    def __init__(self, group_id: int) -> None:
+        self.group_id = group_id
+        self.message_id: Optional[int] = None
+        self.text = ""
+        self.shown_text = ""
+        self.edited_at = 0.0  # Event loop time
+        self.timer: Optional[Timer] = None
+        self.task: Optional[asyncio.Task] = None  # Edit in progress
+
+    def attach(self, message: types.Message, text: str) -> None:
+        # Use a message just sent with the text as the panel
+        self.close()
+        self.message_id = message.message_id
+        self.text = self.shown_text = text
+        self.edited_at = loop.time()
+
+    def update(self, text: str) -> None:
+        self.text = text
+        if self.message_id and not self.timer and text != self.shown_text:
+            self.timer = timer_wheel.schedule(
+                max(loop.time(), self.edited_at + self.EDIT_INTERVAL), self.start_refresh
+            )
+
+    def start_refresh(self) -> None:
+        self.task = asyncio.create_task(self.refresh())
+
+    async def refresh(self) -> None:
+        self.timer = None
+        if not self.message_id or self.text == self.shown_text:
+            return
+
+        text = self.text
+        self.edited_at = loop.time()
+        try:
+            # Keep turn prompts ahead of panel edits in the outbox
+            with sending_priority(Priority.CHATTER):
+                await bot.edit_message_text(
+                    text, self.group_id, self.message_id,
+                    parse_mode=types.ParseMode.HTML, disable_web_page_preview=True
+                )
+        except MessageNotModified:
+            pass
+        except (MessageToEditNotFound, MessageCantBeEdited, Unauthorized):  # Deleted by an admin, or bot kicked
+            self.message_id = None
+            return
+        except RetryAfter as e:
+            self.edited_at = loop.time() + e.timeout
+            self.update(self.text)
+            return
+        except (NetworkError, asyncio.TimeoutError):  # Try again later
+            self.update(self.text)
+            return
+        except TelegramAPIError:
+            logger.exception(f"Failed to edit the panel in group {self.group_id}")
+            return
+        self.shown_text = text
+        if self.text != text:  # Updated while editing
+            self.update(self.text)
+
+    def close(self) -> None:
+        if self.timer:
+            timer_wheel.cancel(self.timer)
+            self.timer = None
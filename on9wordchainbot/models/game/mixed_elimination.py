@@ -8,8 +8,11 @@ from .banned_letters import BannedLettersGame
 from .chosen_first_letter import ChosenFirstLetterGame
 from .classic import ClassicGame
 from .elimination import EliminationGame
+from .leaderboard import Leaderboard
 from .required_letter import RequiredLetterGame
+from ...outbox import Priority
 from ...utils import check_word_existence, get_random_word
+from ...words import Words
 
 
 class MixedEliminationGame(EliminationGame):
@@ -55,7 +58,7 @@ class MixedEliminationGame(EliminationGame):
 
         text += f"Yanıtlamanız gereken <b>{self.time_limit}s</b> süreniz var.\n\n"
         text += "Skor tablosu:\n" + self.get_leaderboard(show_player=self.players_in_game[0])
-        await self.send_message(text, parse_mode=types.ParseMode.HTML)
+        await self.send_message(text, parse_mode=types.ParseMode.HTML, priority=Priority.TURN)
 
         # Reset per-turn attributes
         self.answered = False
@@ -99,8 +102,12 @@ class MixedEliminationGame(EliminationGame):
         if not await self.additional_answer_checkers(word, message):
             return
 
-        self.post_turn_processing(word)
-        await self.send_post_turn_message(word)
+        await self.handle_accepted_answer(word)
+
+    def answer_possible(self) -> bool:
+        if self.game_mode is ChosenFirstLetterGame:
+            return self.used_words.remaining(self.current_word[0], self.min_letters_limit) > 0
+        return super().answer_possible()
 
     def post_turn_processing(self, word: str) -> None:
         super().post_turn_processing(word)
@@ -108,6 +115,7 @@ class MixedEliminationGame(EliminationGame):
             RequiredLetterGame.change_required_letter(self)
 
     async def running_initialization(self) -> None:
+        self.leaderboard = Leaderboard(self.players_in_game)
         self.start_time = datetime.now().replace(microsecond=0)
         self.turns_until_elimination = len(self.players_in_game)
         self.game_mode = random.choice(self.game_modes)
@@ -115,12 +123,15 @@ class MixedEliminationGame(EliminationGame):
         # First round is special since first word has to be set
 
         # Set starting word and mode-based attributes
+        if self.game_mode is BannedLettersGame and not BannedLettersGame.set_banned_letters(self):
+            self.game_mode = ClassicGame
         if self.game_mode is BannedLettersGame:
-            BannedLettersGame.set_banned_letters(self)
             self.current_word = get_random_word(banned_letters=self.banned_letters)
         elif self.game_mode is ChosenFirstLetterGame:
-            # Ensure uniform probability of each letter as the starting letter
-            self.current_word = get_random_word(prefix=random.choice(ascii_lowercase))
+            # Ensure uniform probability of each letter that starts any word as the starting letter
+            self.current_word = get_random_word(
+                prefix=random.choice([c for c in ascii_lowercase if Words.index.count(c)])
+            )
         else:
             self.current_word = get_random_word()
         if self.game_mode is RequiredLetterGame:
@@ -141,21 +152,25 @@ class MixedEliminationGame(EliminationGame):
             round_text += f"\nSeçilen ilk harf <i>{self.current_word[0].upper()}</i>."
         elif self.game_mode is BannedLettersGame:
             round_text += f"\nYasaklanan harfler: <i>{', '.join(c.upper() self.banned_letters)}</i>"
-        round_text += "\n\nLeaderboard:\n" + self.get_leaderboard()
-        await self.send_message(round_text, parse_mode=types.ParseMode.HTML)
+        self.buffer_message(round_text)
 
     def set_game_mode(self) -> None:
         # Random game mode without having the same mode twice in a row
         modes = self.game_modes[:]
         if self.game_mode:
             modes.remove(self.game_mode)
-        self.game_mode = random.choice(modes)
-
-        # Set mode-based attributes
-        if self.game_mode is BannedLettersGame:
-            BannedLettersGame.set_banned_letters(self)
-        elif self.game_mode is RequiredLetterGame:
-            RequiredLetterGame.change_required_letter(self)
+        random.shuffle(modes)
+
+        # Set mode-based attributes, skipping modes with no solvable banned/required letters
+        for self.game_mode in modes:
+            if self.game_mode is BannedLettersGame:
+                if BannedLettersGame.set_banned_letters(self):
+                    return
+            elif self.game_mode is RequiredLetterGame:
+                if RequiredLetterGame.change_required_letter(self):
+                    return
+            else:
+                return
 
     async def handle_round_start(self) -> None:
         self.turns_until_elimination = len(self.players_in_game)
@@ -168,5 +183,6 @@ class MixedEliminationGame(EliminationGame):
             round_text += f"\nThe chosen first letter is <i>{self.current_word.upper()}</i>."
         elif self.game_mode is BannedLettersGame:
             round_text += f"\nBanned letters: <i>{', '.join(c.upper() for c in self.banned_letters)}</i>"
-        round_text += "\n\nLeaderboard:\n" + self.get_leaderboard()
-        await self.send_message(round_text, parse_mode=types.ParseMode.HTML)
+        # Sent with the first turn message of the round, the leaderboard is kept on the panel
+        self.buffer_message(round_text)
+        self.update_panel()
@@ -6,7 +6,9 @@ from typing import Optional
 from aiogram import types
 
 from .classic import ClassicGame
+from ...outbox import Priority
 from ...utils import get_random_word
+from ...words import Words
 
 
 class RequiredLetterGame(ClassicGame):
@@ -32,7 +34,7 @@ class RequiredLetterGame(ClassicGame):
                 f"Kalan oyuncular: {len(self.players_in_game)}/{len(self.players)}\n"
                 f"Toplam kelime: {self.turns}"
             ),
-            parse_mode=types.ParseMode.HTML
+            parse_mode=types.ParseMode.HTML, priority=Priority.TURN
         )
 
         # Reset per-turn attributes
@@ -60,10 +62,18 @@ class RequiredLetterGame(ClassicGame):
             return False
         return True
 
-    def change_required_letter(self) -> None:
+    def change_required_letter(self) -> bool:
+        # Only pick letters some word starting with the current last letter contains.
+        # Returns False if there is no such letter, in which case any letter is picked.
         letters = list(ascii_lowercase)
-        letters.remove(self.current_word[-1])
-        self.required_letter = random.choice(letters)
+        if self.current_word[-1] in letters:
+            letters.remove(self.current_word[-1])
+        solvable_letters = [
+            c for c in letters
+            if Words.index.count_containing(self.current_word[-1], c, self.min_letters_limit)
+        ]
+        self.required_letter = random.choice(solvable_letters or letters)
+        return bool(solvable_letters)
 
     def post_turn_processing(self, word: str) -> None:
         super().post_turn_processing(word)
@@ -0,0 +1,100 @@
+import random
+from collections import deque
+from itertools import count
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..player import Player
+
+
+class Roster:
+    # Players in turn order, indexed by user id.
+    # Each player has one live entry in the queue. Removed or moved players are dropped from the index only,
+    # and their stale entries are skipped lazily, so rotation, membership and removal are all O(1).
+    # A separate list supports O(1) random choice (swap removal, so it does not keep turn order).
+
+    __slots__ = ("queue", "entries", "members", "positions", "counter")
+
+    def __init__(self, players: Iterable[Player] = ()) -> None:
+        self.queue: Deque[Tuple[int, Player]] = deque()
+        self.entries: Dict[int, int] = {}  # User id mapped to id of the live queue entry of the player
+        self.members: List[Player] = []
+        self.positions: Dict[int, int] = {}  # User id mapped to index in self.members
+        self.counter = count()
+        for player in players:
+            self.append(player)
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __contains__(self, player: Player) -> bool:
+        return self.get(player.user_id) is player
+
+    def __iter__(self) -> Iterator[Player]:
+        # Turn order
+        return (player for entry, player in self.queue if self.entries.get(player.user_id) == entry)
+
+    def __getitem__(self, i: int) -> Player:
+        # O(1) for the current player, O(|i|) otherwise
+        self.compact()
+        if i < 0:
+            players = (player for entry, player in reversed(self.queue) if self.entries.get(player.user_id) == entry)
+            i = -i - 1
+        else:
+            players = iter(self)
+        for player in players:
+            if not i:
+                return player
+            i -= 1
+        raise IndexError("roster index out of range")
+
+    def get(self, user_id: int) -> Optional[Player]:
+        position = self.positions.get(user_id)
+        return None if position is None else self.members[position]
+
+    def append(self, player: Player) -> None:
+        entry = next(self.counter)
+        self.queue.append((entry, player))
+        self.entries[player.user_id] = entry
+        self.positions[player.user_id] = len(self.members)
+        self.members.append(player)
+
+    def remove(self, user_id: int) -> Optional[Player]:
+        position = self.positions.pop(user_id, None)
+        if position is None:
+            return None
+        del self.entries[user_id]
+
+        # Swap with the last member to remove in O(1)
+        player = self.members[position]
+        last = self.members.pop()
+        if last is not player:
+            self.members[position] = last
+            self.positions[last.user_id] = position
+
+        self.compact()
+        return player
+
+    def rotate(self) -> None:
+        # Move current player to the end of the queue
+        self.compact()
+        self.queue.append(self.queue.popleft())
+
+    def move_to_front(self, player: Player) -> None:
+        entry = next(self.counter)
+        self.queue.appendleft((entry, player))
+        self.entries[player.user_id] = entry
+
+    def random_player(self, exclude: Optional[Player] = None) -> Player:
+        # Expected O(1) as long as there are at least two players
+        while True:
+            player = random.choice(self.members)
+            if player is not exclude or len(self.members) == 1:
+                return player
+
+    def compact(self) -> None:
+        # Drop stale entries from the front, and rebuild the queue once most of it is stale
+        while self.queue and self.entries.get(self.queue[0][1].user_id) != self.queue[0][0]:
+            self.queue.popleft()
+        if len(self.queue) > 2 * len(self.members) + 8:
+            self.queue = deque((entry, player) for entry, player in self.queue
+                               if self.entries.get(player.user_id) == entry)
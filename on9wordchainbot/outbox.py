@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    TURN = 0  # Turn prompts and round changes, players are waiting on them
+    GAME = 1  # Other game messages and command replies
+    CHATTER = 2  # Join and flee announcements
+
+
+# Tokens a request leaves in the buckets for requests of higher priority
+RESERVED_TOKENS = {Priority.TURN: 0, Priority.GAME: 1, Priority.CHATTER: 3}
+
+# Requests sending or editing messages, which count towards Telegram's flood limits
+QUEUED_METHODS = {
+    "sendMessage", "forwardMessage", "copyMessage", "sendPhoto", "sendAudio", "sendDocument", "sendVideo",
+    "sendAnimation", "sendVoice", "sendVideoNote", "sendMediaGroup", "sendLocation", "sendVenue", "sendContact",
+    "sendPoll", "sendDice", "sendSticker", "sendInvoice", "sendGame", "editMessageText", "editMessageCaption",
+    "editMessageMedia", "editMessageReplyMarkup"
+}
+
+current_priority: ContextVar[Priority] = ContextVar("current_priority", default=Priority.GAME)
+
+
+@contextmanager
+def sending_priority(priority: Priority) -> Iterator[None]:
+    # Priority of requests made within the block
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate  # Tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, reserve: float = 0) -> float:
+        # Seconds until a token can be taken while leaving reserve tokens
+        self.refill(now)
+        reserve = min(reserve, self.capacity - 1)
+        return max((1 + reserve - self.tokens) / self.rate, 0)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class ChatQueue:
+    __slots__ = ("bucket", "requests", "retry_at", "task")
+
+    def __init__(self, chat_id: Union[int, str]) -> None:
+        # Telegram allows about 20 messages a minute in a group and one a second in a private chat
+        group = not isinstance(chat_id, int) or chat_id < 0
+        self.bucket = TokenBucket(20 / 60, 20) if group else TokenBucket(1, 3)
+        self.requests: List[Tuple[Priority, int, asyncio.Future, Callable[[], Awaitable[Any]]]] = []  # Heap
+        self.retry_at = 0.0  # Time until which Telegram asked to stop sending after a RetryAfter error
+        self.task: Optional[asyncio.Task] = None
+
+
+class Outbox:
+    # Outgoing requests of a bot, queued per chat and sent in priority order (FIFO within a priority)
+    # as fast as a token bucket per chat and one over all chats allow.
+    # Each chat with queued requests has a task sending them one at a time.
+    # A RetryAfter error pauses the chat for the time Telegram asked, and the request is sent again afterwards.
+
+    def __init__(self) -> None:
+        self.bucket = TokenBucket(30, 30)  # Telegram allows about 30 messages a second over all chats
+        self.queues: Dict[Union[int, str], ChatQueue] = {}
+        self.counter = itertools.count()
+        self.depth = 0  # Queued requests
+        self.peak_depth = 0
+        self.sent = 0
+        self.retries = 0
+
+    def share(self, parts: int) -> None:
+        # The overall limit is per bot, so split it when several processes send as the same bot
+        self.bucket = TokenBucket(self.bucket.rate / parts, max(self.bucket.capacity / parts, 1))
+
+    def longest_queue(self) -> int:
+        return max((len(queue.requests) for queue in self.queues.values()), default=0)
+
+    async def submit(self, chat_id: Union[int, str], priority: Priority, send: Callable[[], Awaitable[Any]]) -> Any:
+        queue = self.queues.get(chat_id)
+        if not queue:
+            queue = self.queues[chat_id] = ChatQueue(chat_id)
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(queue.requests, (priority, next(self.counter), future, send))
+        self.depth += 1
+        self.peak_depth = max(self.peak_depth, self.depth)
+        if not queue.task:
+            queue.task = asyncio.create_task(self.drain(chat_id, queue))
+        return await future  # Cancelling the caller drops the request if it is not being sent yet
+
+    async def drain(self, chat_id: Union[int, str], queue: ChatQueue) -> None:
+        try:
+            while queue.requests:
+                priority, seq, future, send = queue.requests[0]
+                if future.done():  # Cancelled
+                    heapq.heappop(queue.requests)
+                    self.depth -= 1
+                    continue
+
+                now = time.monotonic()
+                reserve = RESERVED_TOKENS[priority]
+                wait = max(
+                    queue.bucket.wait_time(now, reserve), self.bucket.wait_time(now, reserve), queue.retry_at - now
+                )
+                if wait > 0:
+                    # A request of higher priority queued meanwhile goes first
+                    await asyncio.sleep(wait)
+                    continue
+
+                heapq.heappop(queue.requests)
+                queue.bucket.take()
+                self.bucket.take()
+                try:
+                    result = await send()
+                except RetryAfter as e:
+                    logger.warning(f"Flood control in chat {chat_id}, retrying in {e.timeout}s")
+                    queue.retry_at = time.monotonic() + e.timeout
+                    heapq.heappush(queue.requests, (priority, seq, future, send))
+                    self.retries += 1
+                    continue
+                except asyncio.CancelledError:
+                    future.cancel()
+                    self.depth -= 1
+                    raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.sent += 1
+                    if not future.done():
+                        future.set_result(result)
+                self.depth -= 1
+        finally:
+            for _, _, future, _ in queue.requests:  # Only left if the bot is shutting down
+                future.cancel()
+            self.depth -= len(queue.requests)
+            queue.requests.clear()
+            queue.task = None
+            # Keep the bucket until it refills so that a new burst does not exceed the limit
+            asyncio.get_event_loop().call_later(
+                queue.bucket.capacity / queue.bucket.rate, self.prune, chat_id, queue
+            )
+
+    def prune(self, chat_id: Union[int, str], queue: ChatQueue) -> None:
+        if self.queues.get(chat_id) is queue and not queue.task:
+            del self.queues[chat_id]
+
+
+def rewind(files: Optional[Dict[str, Any]]) -> None:
+    # Uploads are read while sending, so rewind them before sending again
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, tuple) else getattr(value, "file", value)
+        if hasattr(file, "seekable") and file.seekable():
+            file.seek(0)
+
+
+class QueuedBot(Bot):
+    # Bot sending messages through an Outbox. The priority is taken from the sending_priority block
+    # the request is made in, so game messages and handler replies alike are queued without changes.
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.outbox = Outbox()
+
+    async def request(self, method: str, data: Optional[Dict] = None, files: Optional[Dict] = None, **kwargs: Any):
+        request = super().request
+        chat_id = data.get("chat_id") if data else None
+        if chat_id is None or method not in QUEUED_METHODS:
+            return await request(method, data, files, **kwargs)
+
+        async def send() -> Any:
+            rewind(files)
+            return await request(method, data, files, **kwargs)
+
+        return await self.outbox.submit(chat_id, current_priority.get(), send)
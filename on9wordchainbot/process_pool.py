@@ -0,0 +1,15 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    # Worker processes for CPU heavy work kept off the event loop, i.e. dictionary builds and /trend graphs.
+    # Two so that graphs are not held up by a dictionary build.
+    global _executor
+    if _executor is None:
+        # Fork explicitly since importing this package in a fresh interpreter connects to the database
+        _executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("fork"))
+    return _executor
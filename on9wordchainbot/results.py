@@ -0,0 +1,423 @@
+import asyncio
+import logging
+import pickle
+import sqlite3
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Times a batch may be rejected by the database before it is split in half to find the result at fault,
+# and a single result before it is set aside
+MAX_ATTEMPTS = 3
+
+
+class ResultSpool:
+    # Results of finished games waiting to be saved to the database, kept in a local SQLite database
+    # so that ending a game never waits for Postgres and no result is lost if it is slow or down.
+    # drain saves them in batches in the background and is also what replays them after a restart.
+    # Saving is idempotent (a game is identified by group id and start time), so a result saved just before
+    # a crash and still spooled is not counted twice.
+    # A result the database keeps rejecting is moved to the failed_result table so it does not hold up the rest.
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.execute("PRAGMA synchronous = NORMAL;")
+        self.conn.execute("PRAGMA busy_timeout = 5000;")  # Shared by worker processes
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS result "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, group_id INTEGER NOT NULL, result BLOB NOT NULL);"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS failed_result "
+            "(id INTEGER PRIMARY KEY, group_id INTEGER NOT NULL, result BLOB NOT NULL, error TEXT NOT NULL);"
+        )
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()  # Replay results spooled before the last shutdown
+
+    def append(self, result: Dict[str, Any]) -> None:
+        self.conn.execute(
+            "INSERT INTO result (group_id, result) VALUES (?, ?);",
+            (result["group_id"], pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        )
+        self.wakeup.set()
+
+    def pending(self, limit: int, shard: int = 0, shards: int = 1) -> List[Tuple[int, Dict[str, Any]]]:
+        # Oldest results of games of the shard
+        batch = []
+        for row_id, group_id, result in self.conn.execute("SELECT id, group_id, result FROM result ORDER BY id;"):
+            if group_id % shards != shard:
+                continue
+            try:
+                batch.append((row_id, pickle.loads(result)))
+            except Exception:
+                logger.exception(f"Unreadable result of game in group {group_id}")
+                self.remove([row_id])
+                continue
+            if len(batch) == limit:
+                break
+        return batch
+
+    def remove(self, row_ids: List[int]) -> None:
+        self.conn.executemany("DELETE FROM result WHERE id = ?;", [(row_id,) for row_id in row_ids])
+
+    def set_aside(self, row_id: int, error: str) -> None:
+        with self.conn:  # One transaction
+            self.conn.execute("BEGIN;")
+            self.conn.execute(
+                "INSERT INTO failed_result SELECT id, group_id, result, ? FROM result WHERE id = ?;", (error, row_id)
+            )
+            self.conn.execute("DELETE FROM result WHERE id = ?;", (row_id,))
+
+    async def drain(
+        self,
+        pool: asyncpg.pool.Pool,
+        shard: int = 0,
+        shards: int = 1,
+        batch_size: int = 50,
+        report: Optional[Callable[[str], Awaitable[Any]]] = None
+    ) -> None:
+        # Runs for the lifetime of the bot, retrying with exponential backoff while the database is unavailable.
+        # report is called with a message when a result is set aside.
+        delay = 1
+        limit = batch_size
+        attempts = 0
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while True:
+                batch = self.pending(limit, shard, shards)
+                if not batch:
+                    limit = batch_size
+                    break
+                try:
+                    async with pool.acquire() as conn, conn.transaction():
+                        await save_results(conn, [result for _, result in batch])
+                except Exception as e:
+                    logger.exception(f"Failed to save {len(batch)} game results")
+                    # Errors raised by Postgres mean the database is up but rejected the batch,
+                    # which is likely to happen again if a result in it is at fault
+                    if isinstance(e, asyncpg.PostgresError):
+                        attempts += 1
+                        if attempts >= MAX_ATTEMPTS:
+                            attempts = 0
+                            if len(batch) > 1:
+                                limit = len(batch) // 2
+                                continue
+                            row_id, result = batch[0]
+                            self.set_aside(row_id, f"{e.__class__.__name__}: {e}")
+                            limit = batch_size
+                            logger.error(f"Set aside result of game in group {result['group_id']}")
+                            if report:
+                                try:
+                                    await report(
+                                        f"Result of game in group `{result['group_id']}` could not be saved "
+                                        f"and was set aside (`{e.__class__.__name__}`)."
+                                    )
+                                except Exception:
+                                    logger.exception("Failed to report result set aside")
+                            continue
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 300)
+                    continue
+                delay = 1
+                attempts = 0
+                self.remove([row_id for row_id, _ in batch])
+
+
+def merge_longest_word(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    # If both words have the same length, the first one is kept
+    if not a or (b and len(b) > len(a)):
+        return b
+    return a
+
+
+async def save_results(conn: asyncpg.Connection, results: List[Dict[str, Any]]) -> None:
+    # Save results of finished games in one go, skipping those saved already,
+    # and keep the group, global and daily statistics tables up to date with them.
+    # The same statements however many games and players there are.
+    # Rows of each table are locked in key order so that concurrent transactions cannot deadlock.
+    game_rows = await conn.fetch(
+        """\
+        INSERT INTO game (group_id, players, game_mode, winner, start_time, end_time)
+            SELECT * FROM UNNEST(
+                $1::BIGINT[], $2::INTEGER[], $3::TEXT[], $4::BIGINT[], $5::TIMESTAMP[], $6::TIMESTAMP[]
+            )
+        ON CONFLICT (group_id, start_time) DO NOTHING
+        RETURNING id, group_id, start_time;""",
+        [r["group_id"] for r in results],
+        [len(r["players"]) for r in results],
+        [r["game_mode"] for r in results],
+        [r["winner"] for r in results],
+        [r["start_time"] for r in results],
+        [r["end_time"] for r in results]
+    )
+    game_ids = {(row["group_id"], row["start_time"]): row["id"] for row in game_rows}
+
+    # A player may have played several of the games, so totals are added up first
+    # since one upsert cannot change a row twice
+    totals: Dict[int, List[Any]] = defaultdict(lambda: [0, 0, 0, 0, None])
+    group_totals: Dict[int, List[int]] = defaultdict(lambda: [0, 0, 0])  # Games, words and letters
+    group_players = set()
+    gameplayers = []
+    # Daily statistics are by the day a game started
+    daily_games: Counter = Counter()
+    daily_modes: Counter = Counter()
+    daily_groups = set()
+    daily_players = set()
+    group_first_days: Dict[int, date] = {}
+    player_first_days: Dict[int, date] = {}
+    for result in results:
+        game_id = game_ids.get((result["group_id"], result["start_time"]))
+        if game_id is None:  # Saved already
+            continue
+        group_total = group_totals[result["group_id"]]
+        group_total[0] += 1
+        day = result["start_time"].date()
+        daily_games[day] += 1
+        daily_modes[day, result["game_mode"]] += 1
+        daily_groups.add((day, result["group_id"]))
+        group_first_days[result["group_id"]] = min(day, group_first_days.get(result["group_id"], day))
+        for user_id, won, word_count, letter_count, longest_word in result["players"]:
+            total = totals[user_id]
+            total[0] += 1
+            total[1] += won
+            total[2] += word_count
+            total[3] += letter_count
+            total[4] = merge_longest_word(total[4], longest_word)
+            group_total[1] += word_count
+            group_total[2] += letter_count
+            group_players.add((result["group_id"], user_id))
+            daily_players.add((day, user_id))
+            player_first_days[user_id] = min(day, player_first_days.get(user_id, day))
+            gameplayers.append(
+                (user_id, result["group_id"], game_id, won, word_count, letter_count, longest_word)
+            )
+    if not gameplayers:
+        return
+
+    user_ids = sorted(totals)
+    player_rows = await conn.fetch(
+        """\
+        INSERT INTO player (user_id, game_count, win_count, word_count, letter_count, longest_word)
+            SELECT * FROM UNNEST(
+                $1::BIGINT[], $2::INTEGER[], $3::INTEGER[], $4::INTEGER[], $5::INTEGER[], $6::TEXT[]
+            )
+        ON CONFLICT (user_id) DO UPDATE
+        SET game_count = player.game_count + EXCLUDED.game_count,
+            win_count = player.win_count + EXCLUDED.win_count,
+            word_count = player.word_count + EXCLUDED.word_count,
+            letter_count = player.letter_count + EXCLUDED.letter_count,
+            longest_word = CASE WHEN player.longest_word IS NULL THEN EXCLUDED.longest_word
+                                WHEN EXCLUDED.longest_word IS NULL THEN player.longest_word
+                                WHEN LENGTH(EXCLUDED.longest_word) > LENGTH(player.longest_word)
+                                    THEN EXCLUDED.longest_word
+                                ELSE player.longest_word
+                           END
+        RETURNING user_id, xmax = 0;""",  # True if inserted rather than updated
+        user_ids,
+        *([totals[user_id][i] for user_id in user_ids] for i in range(5))
+    )
+
+    await conn.copy_records_to_table(
+        "gameplayer",
+        records=gameplayers,
+        columns=("user_id", "group_id", "game_id", "won", "word_count", "letter_count", "longest_word")
+    )
+
+    # Players new to each group
+    group_players = sorted(group_players)
+    new_group_players = Counter(
+        row[0] for row in await conn.fetch(
+            """\
+            INSERT INTO group_player (group_id, user_id)
+                SELECT * FROM UNNEST($1::BIGINT[], $2::BIGINT[])
+            ON CONFLICT DO NOTHING
+            RETURNING group_id;""",
+            [group_id for group_id, _ in group_players],
+            [user_id for _, user_id in group_players]
+        )
+    )
+
+    group_ids = sorted(group_totals)
+    group_rows = await conn.fetch(
+        """\
+        INSERT INTO group_stats (group_id, player_count, game_count, word_count, letter_count)
+            SELECT * FROM UNNEST($1::BIGINT[], $2::INTEGER[], $3::INTEGER[], $4::BIGINT[], $5::BIGINT[])
+        ON CONFLICT (group_id) DO UPDATE
+        SET player_count = group_stats.player_count + EXCLUDED.player_count,
+            game_count = group_stats.game_count + EXCLUDED.game_count,
+            word_count = group_stats.word_count + EXCLUDED.word_count,
+            letter_count = group_stats.letter_count + EXCLUDED.letter_count
+        RETURNING group_id, xmax = 0;""",
+        group_ids,
+        [new_group_players[group_id] for group_id in group_ids],
+        *([group_totals[group_id][i] for group_id in group_ids] for i in range(3))
+    )
+
+    await conn.execute(
+        """\
+        UPDATE global_stats
+        SET group_count = group_count + $1,
+            player_count = player_count + $2,
+            game_count = game_count + $3,
+            word_count = word_count + $4,
+            letter_count = letter_count + $5
+        WHERE id;""",
+        sum(row[1] for row in group_rows),
+        sum(row[1] for row in player_rows),
+        len(game_ids),
+        sum(total[1] for total in group_totals.values()),
+        sum(total[2] for total in group_totals.values())
+    )
+
+    # Groups and players active on each day for the first time that day
+    daily_groups = sorted(daily_groups)
+    new_active_groups = Counter(
+        row[0] for row in await conn.fetch(
+            """\
+            INSERT INTO daily_group (day, group_id)
+                SELECT * FROM UNNEST($1::DATE[], $2::BIGINT[])
+            ON CONFLICT DO NOTHING
+            RETURNING day;""",
+            [day for day, _ in daily_groups],
+            [group_id for _, group_id in daily_groups]
+        )
+    )
+    daily_players = sorted(daily_players)
+    new_active_players = Counter(
+        row[0] for row in await conn.fetch(
+            """\
+            INSERT INTO daily_player (day, user_id)
+                SELECT * FROM UNNEST($1::DATE[], $2::BIGINT[])
+            ON CONFLICT DO NOTHING
+            RETURNING day;""",
+            [day for day, _ in daily_players],
+            [user_id for _, user_id in daily_players]
+        )
+    )
+    # Groups and players seen for the first time ever, on the first day they played in this batch
+    new_groups = Counter(group_first_days[row[0]] for row in group_rows if row[1])
+    new_players = Counter(player_first_days[row[0]] for row in player_rows if row[1])
+
+    modes = sorted(daily_modes)
+    await conn.execute(
+        """\
+        INSERT INTO daily_game_mode (day, game_mode, game_count)
+            SELECT * FROM UNNEST($1::DATE[], $2::TEXT[], $3::INTEGER[])
+        ON CONFLICT (day, game_mode) DO UPDATE
+        SET game_count = daily_game_mode.game_count + EXCLUDED.game_count;""",
+        [day for day, _ in modes],
+        [game_mode for _, game_mode in modes],
+        [daily_modes[mode] for mode in modes]
+    )
+    days = sorted(daily_games)
+    await conn.execute(
+        """\
+        INSERT INTO daily_stats (day, game_count, group_count, player_count, new_group_count, new_player_count)
+            SELECT * FROM UNNEST($1::DATE[], $2::INTEGER[], $3::INTEGER[], $4::INTEGER[], $5::INTEGER[], $6::INTEGER[])
+        ON CONFLICT (day) DO UPDATE
+        SET game_count = daily_stats.game_count + EXCLUDED.game_count,
+            group_count = daily_stats.group_count + EXCLUDED.group_count,
+            player_count = daily_stats.player_count + EXCLUDED.player_count,
+            new_group_count = daily_stats.new_group_count + EXCLUDED.new_group_count,
+            new_player_count = daily_stats.new_player_count + EXCLUDED.new_player_count;""",
+        days,
+        [daily_games[day] for day in days],
+        [new_active_groups[day] for day in days],
+        [new_active_players[day] for day in days],
+        [new_groups[day] for day in days],
+        [new_players[day] for day in days]
+    )
+
+
+async def migrate_group_stats(conn: asyncpg.Connection, old_group_id: int, new_group_id: int) -> None:
+    # Rebuild statistics of a group that moved to a new chat id, after its games and gameplayers have moved.
+    # Both ids may have statistics if games were saved under the new id already.
+    removed = await conn.fetchval(
+        """\
+        WITH removed AS (DELETE FROM group_stats WHERE group_id = ANY($1::BIGINT[]) RETURNING 1)
+        SELECT COUNT(*) FROM removed;""",
+        [old_group_id, new_group_id]
+    )
+    await conn.execute(
+        "DELETE FROM group_player WHERE group_id = ANY($1::BIGINT[]);", [old_group_id, new_group_id]
+    )
+    await conn.execute(
+        """\
+        INSERT INTO group_player (group_id, user_id)
+            SELECT DISTINCT group_id, user_id
+                FROM gameplayer
+                WHERE group_id = $1;""",
+        new_group_id
+    )
+    await conn.execute(
+        """\
+        INSERT INTO group_stats (group_id, player_count, game_count, word_count, letter_count)
+            SELECT group_id, COUNT(DISTINCT user_id), COUNT(DISTINCT game_id), SUM(word_count), SUM(letter_count)
+                FROM gameplayer
+                WHERE group_id = $1
+                GROUP BY group_id;""",
+        new_group_id
+    )
+    await conn.execute(
+        """\
+        UPDATE global_stats
+        SET group_count = group_count - $1 + (SELECT COUNT(*) FROM group_stats WHERE group_id = $2)
+        WHERE id;""",
+        removed,
+        new_group_id
+    )
+
+
+async def rebuild_daily_stats(conn: asyncpg.Connection) -> None:
+    # Fill the daily statistics tables from all saved games, to be run in a transaction.
+    # Games cannot be saved meanwhile, so none are counted twice or missed.
+    await conn.execute("LOCK TABLE game IN SHARE MODE;")
+    await conn.execute("TRUNCATE daily_stats, daily_game_mode, daily_group, daily_player;")
+    await conn.execute(
+        """\
+        INSERT INTO daily_group (day, group_id)
+            SELECT DISTINCT start_time::DATE, group_id
+                FROM game;"""
+    )
+    await conn.execute(
+        """\
+        INSERT INTO daily_player (day, user_id)
+            SELECT DISTINCT game.start_time::DATE, gameplayer.user_id
+                FROM gameplayer
+                INNER JOIN game ON gameplayer.game_id = game.id;"""
+    )
+    await conn.execute(
+        """\
+        INSERT INTO daily_game_mode (day, game_mode, game_count)
+            SELECT start_time::DATE, game_mode, COUNT(*)
+                FROM game
+                GROUP BY 1, 2;"""
+    )
+    await conn.execute(
+        """\
+        INSERT INTO daily_stats (day, game_count, group_count, player_count, new_group_count, new_player_count)
+            WITH games AS (
+                SELECT day, SUM(game_count) n FROM daily_game_mode GROUP BY day
+            ), groups AS (
+                SELECT day, COUNT(*) n FROM daily_group GROUP BY day
+            ), players AS (
+                SELECT day, COUNT(*) n FROM daily_player GROUP BY day
+            ), new_groups AS (
+                SELECT day, COUNT(*) n FROM (SELECT MIN(day) AS day FROM daily_group GROUP BY group_id) f GROUP BY day
+            ), new_players AS (
+                SELECT day, COUNT(*) n FROM (SELECT MIN(day) AS day FROM daily_player GROUP BY user_id) f GROUP BY day
+            )
+            SELECT day, games.n, COALESCE(groups.n, 0), COALESCE(players.n, 0),
+                   COALESCE(new_groups.n, 0), COALESCE(new_players.n, 0)
+                FROM games
+                LEFT JOIN groups USING (day)
+                LEFT JOIN players USING (day)
+                LEFT JOIN new_groups USING (day)
+                LEFT JOIN new_players USING (day);"""
+    )
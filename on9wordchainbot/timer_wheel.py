@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ("deadline", "expiry", "callback", "cancelled", "handle")
+
+    def __init__(self, deadline: float, expiry: int, callback: Callable[[], None]) -> None:
+        self.deadline = deadline  # Event loop (monotonic) time
+        self.expiry = expiry  # Last wheel tick before the deadline
+        self.callback = callback
+        self.cancelled = False
+        self.handle: Optional[asyncio.TimerHandle] = None  # Set once handed over to the event loop
+
+
+class TimerWheel:
+    # Hierarchical timing wheel owning the deadlines of every game in the process.
+    # Level 0 has one slot per tick, each slot of a higher level spans a full turn of the level below
+    # and is cascaded down when that turn starts, so scheduling and cancelling are O(1).
+    # Time comes from the event loop's monotonic clock and ticks are counted from a fixed origin,
+    # so a busy event loop delays ticks without making them drift.
+    # On the last tick before its deadline a timer is handed over to the event loop to fire at the exact deadline,
+    # so the event loop only ever holds the timers due within a tick plus the callback for the next tick,
+    # and nothing while no timers are registered.
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, tick: float = 1, slots: int = 64, levels: int = 3) -> None:
+        self.loop = loop
+        self.tick = tick
+        self.slots = slots
+        self.wheels: List[List[List[Timer]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.origin = loop.time()
+        self.current = 0  # Last tick processed
+        self.size = 0  # Timers not yet fired or cancelled
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def schedule(self, deadline: float, callback: Callable[[], None]) -> Timer:
+        # Call callback at deadline (event loop time), right away if it has passed
+        if not self.handle:
+            # Idle wheel, catch up with the clock before scheduling
+            self.current = max(int((self.loop.time() - self.origin) // self.tick), self.current)
+        timer = Timer(deadline, int((deadline - self.origin) // self.tick), callback)
+        if timer.expiry <= self.current:
+            # Due before the next tick
+            timer.handle = self.loop.call_at(deadline, self.fire, timer)
+            return timer
+
+        self.insert(timer)
+        self.size += 1
+        if not self.handle:
+            self.handle = self.loop.call_at(self.origin + (self.current + 1) * self.tick, self.advance)
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        # Timers still in the wheel are dropped lazily when their slot comes up
+        if timer.cancelled:
+            return
+        timer.cancelled = True
+        if timer.handle:
+            timer.handle.cancel()
+        else:
+            self.size -= 1
+
+    def fire(self, timer: Timer) -> None:
+        timer.cancelled = True
+        try:
+            timer.callback()
+        except Exception:
+            logger.exception("Timer callback failed")
+
+    def insert(self, timer: Timer) -> None:
+        delta = timer.expiry - self.current
+        for level, wheel in enumerate(self.wheels):
+            span = self.slots ** level
+            if delta < span * self.slots:
+                wheel[timer.expiry // span % self.slots].append(timer)
+                return
+
+        # Beyond the range of the wheel, park it in the furthest top level slot to be cascaded again later
+        span = self.slots ** (len(self.wheels) - 1)
+        self.wheels[-1][(self.current // span - 1) % self.slots].append(timer)
+
+    def advance(self) -> None:
+        # Process every tick due, more than one if the event loop was blocked
+        target = int((self.loop.time() - self.origin) // self.tick)
+        while self.current < target and self.size:
+            self.current += 1
+
+            # Cascade higher level slots whose turn starts on this tick, top down so that
+            # timers moved into a lower level slot starting on this tick are cascaded again
+            level = 1
+            while level < len(self.wheels) and not self.current % self.slots ** level:
+                level += 1
+            for level in range(level - 1, 0, -1):
+                span = self.slots ** level
+                slot = self.wheels[level][self.current // span % self.slots]
+                timers = slot[:]
+                slot.clear()
+                for timer in timers:
+                    if not timer.cancelled:
+                        self.insert(timer)
+
+            # Hand timers due before the next tick over to the event loop
+            slot = self.wheels[0][self.current % self.slots]
+            for timer in slot:
+                if not timer.cancelled:
+                    timer.handle = self.loop.call_at(timer.deadline, self.fire, timer)
+                    self.size -= 1
+            slot.clear()
+
+        if self.size:
+            self.handle = self.loop.call_at(self.origin + (self.current + 1) * self.tick, self.advance)
+        else:
+            # Drop cancelled timers left in the slots before going idle
+            self.handle = None
+            for wheel in self.wheels:
+                for slot in wheel:
+                    slot.clear()
@@ -1,14 +1,14 @@
 import random
 from functools import wraps
 from string import ascii_lowercase
-from typing import Any, Callable, List, Optional, Set
+from typing import Any, Callable, Collection, List, Optional
 
 from aiocache import cached
 from aiogram import types
 
 from . import bot, on9bot, pool
 from .constants import ADMIN_GROUP_ID, VIP
-from .words import Words
+from .words import UsedWords, Words
 
 
 def is_word(s: str) -> bool:
@@ -16,7 +16,22 @@ def is_word(s: str) -> bool:
 
 
 def check_word_existence(word: str) -> bool:
-    return word in Words.dawg
+    return Words.contains(word)
+
+
+def word_matches(
+    word: str,
+    min_len: int = 1,
+    prefix: Optional[str] = None,
+    required_letter: Optional[str] = None,
+    banned_letters: Optional[List[str]] = None
+) -> bool:
+    return (
+        len(word) >= min_len
+        and (not prefix or word.startswith(prefix))
+        and (not required_letter or required_letter in word)
+        and (not banned_letters or all(i not in word for i in banned_letters))
+    )
 
 
 def filter_words(
@@ -24,18 +39,31 @@ def filter_words(
     prefix: Optional[str] = None,
     required_letter: Optional[str] = None,
     banned_letters: Optional[List[str]] = None,
-    exclude_words: Optional[Set[str]] = None
+    exclude_words: Optional[Collection[str]] = None
 ) -> List[str]:
-    words = Words.dawg.keys(prefix) if prefix else Words.dawg.keys()
-    if min_len > 1:
-        words = [w for w in words if len(w) >= min_len]
-    if required_letter:
-        words = [w for w in words if required_letter in w]
-    if banned_letters:
-        words = [w for w in words if all(i not in w for i in banned_letters)]
+    if prefix and len(prefix) > 1:
+        words = [
+            w for w in Words.dawg.keys(prefix)
+            if word_matches(w, min_len, required_letter=required_letter, banned_letters=banned_letters)
+            and (not exclude_words or w not in exclude_words)
+        ]
+    else:
+        # Letter, length and used word conditions are applied as array masks over the word index
+        words = [
+            Words.index.words[i]
+            for i in Words.index.select(
+                min_len, prefix, required_letter, banned_letters,
+                exclude_words if isinstance(exclude_words, UsedWords) else None
+            )
+        ]
+        if exclude_words and not isinstance(exclude_words, UsedWords):
+            words = [w for w in words if w not in exclude_words]
+    if Words.removed:
+        words = [w for w in words if w not in Words.removed]
+    added = [w for w in Words.added if word_matches(w, min_len, prefix, required_letter, banned_letters)]
     if exclude_words:
-        words = [w for w in words if w not in exclude_words]
-    return words
+        added = [w for w in added if w not in exclude_words]
+    return words + added
 
 
 def get_random_word(
@@ -43,8 +71,35 @@ def get_random_word(
     prefix: Optional[str] = None,
     required_letter: Optional[str] = None,
     banned_letters: Optional[List[str]] = None,
-    exclude_words: Optional[Set[str]] = None
+    exclude_words: Optional[Collection[str]] = None
 ) -> Optional[str]:
+    if not prefix or len(prefix) == 1:
+        # Recently added words are drawn from alongside the word index
+        added = [w for w in Words.added if word_matches(w, min_len, prefix, required_letter, banned_letters)]
+
+        if required_letter or banned_letters:
+            positions = Words.index.select(min_len, prefix, required_letter, banned_letters)
+            cnt = len(positions)
+
+            def pick() -> Optional[str]:
+                return Words.index.words[positions[random.randrange(cnt)]]
+        else:
+            cnt = Words.index.count(prefix, min_len)
+
+            def pick() -> Optional[str]:
+                return Words.index.random_word(min_len, prefix)
+
+        if not cnt and not added:
+            return None
+
+        # Sample straight from the word index, retrying a few times on used or removed words
+        # before falling back to filtering every candidate
+        for _ in range(10):
+            n = random.randrange(cnt + len(added))
+            word = added[n - cnt] if n >= cnt else pick()
+            if word not in Words.removed and (not exclude_words or word not in exclude_words):
+                return word
+
     words = filter_words(min_len, prefix, required_letter, banned_letters, exclude_words)
     return random.choice(words) if words else None
 
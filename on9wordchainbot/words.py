@@ -1,29 +1,511 @@
 import asyncio
+import hashlib
+import json
 import logging
-from typing import List
+import mmap
+import os
+import random
+import struct
+import time
+from bisect import bisect_left
+from string import ascii_lowercase
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
+import numpy as np
 from dawg import CompletionDAWG
 
-from .constants import WORDLIST_SOURCE
+from .constants import DICTIONARY_SNAPSHOT, WORDLIST_SOURCE
+from .process_pool import get_executor
 
 logger = logging.getLogger(__name__)
 
 
+def letter_mask(letters: Iterable[str]) -> int:
+    # One bit per letter of the English alphabet, other letters are ignored
+    mask = 0
+    for c in letters:
+        if c in ascii_lowercase:
+            mask |= 1 << (ord(c) - ord("a"))
+    return mask
+
+
+class PackedWords(Sequence):
+    # Newline separated UTF-8 words in a buffer, decoded on access.
+    # Backed by the memory mapped snapshot, so processes mapping the same file share the words
+    # rather than each holding a list of strings.
+
+    __slots__ = ("data", "starts")
+
+    def __init__(self, data: memoryview, starts: np.ndarray) -> None:
+        self.data = data
+        self.starts = starts  # Byte offset of each word, then one past the end of the data
+
+    @staticmethod
+    def encode(words: List[str]) -> Tuple[bytes, np.ndarray]:
+        encoded = [w.encode() for w in words]
+        starts = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        np.cumsum([len(w) + 1 for w in encoded], out=starts[1:])
+        return b"\n".join(encoded), starts
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(i, slice):
+            lo, hi, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(lo, hi, step)]
+            if lo >= hi:
+                return []
+            return str(self.data[int(self.starts[lo]):int(self.starts[hi]) - 1], "utf-8").split("\n")
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("word index out of range")
+        return str(self.data[int(self.starts[i]):int(self.starts[i + 1]) - 1], "utf-8")
+
+
+class WordIndex:
+    # Words are grouped by first letter and sorted by length inside each group,
+    # so all words with a given first letter and at least n letters form one contiguous slice.
+    # Per-word columns are kept as NumPy arrays in the same order for vectorized filtering.
+    # pair_counts[f, c, n] is the number of words starting with the f-th first letter of the dictionary
+    # (in the order of offsets, Turkish letters included), containing the c-th letter of the English alphabet
+    # and having at least n letters, for constant time solvability checks.
+
+    __slots__ = ("words", "offsets", "first_letters", "masks", "lengths", "first", "last", "pair_counts")
+    columns = ("masks", "lengths", "first", "last", "pair_counts")  # NumPy arrays stored in snapshots
+
+    def __init__(self, words: Iterable[str]) -> None:
+        self.words: Sequence[str] = sorted(words, key=lambda w: (w[0], len(w), w))
+        # First letter mapped to a list where the n-th item is the position of
+        # the first word in that group with at least n letters.
+        # The last item marks the end of the group.
+        self.offsets: Dict[str, List[int]] = {}
+
+        i = 0
+        while i < len(self.words):
+            letter = self.words[i][0]
+            starts = []
+            length = 0
+            while i < len(self.words) and self.words[i][0] == letter:
+                while len(self.words[i]) >= length:
+                    starts.append(i)
+                    length += 1
+                i += 1
+            starts.append(i)
+            self.offsets[letter] = starts
+        self.first_letters = {letter: f for f, letter in enumerate(self.offsets)}
+
+        self.lengths = np.fromiter(map(len, self.words), dtype=np.uint16, count=len(self.words))
+        if not self.words:
+            self.masks = np.zeros(0, dtype=np.uint32)
+            self.first = self.last = np.zeros(0, dtype=np.uint32)
+            self.pair_counts = np.zeros((0, 26, 1), dtype=np.int32)
+            return
+
+        # Unicode code points of every word laid end to end
+        codes = np.frombuffer("".join(self.words).encode("utf-32-le"), dtype=np.uint32)
+        word_starts = np.zeros(len(self.words), dtype=np.int64)
+        np.cumsum(self.lengths[:-1], out=word_starts[1:])
+
+        # Letter bitmask of each word, see letter_mask
+        offsets = codes - ord("a")  # Wraps around for code points below "a"
+        bits = np.zeros(len(codes), dtype=np.uint32)
+        is_ascii = offsets < 26
+        bits[is_ascii] = np.left_shift(np.uint32(1), offsets[is_ascii])
+        self.masks = np.bitwise_or.reduceat(bits, word_starts)
+
+        self.first = codes[word_starts]
+        self.last = codes[word_starts + self.lengths - 1]
+
+        # One extra length at the end so longer minimum lengths clamp to a count of zero
+        max_len = int(self.lengths.max()) + 1
+        self.pair_counts = np.zeros((len(self.offsets), 26, max_len + 1), dtype=np.int32)
+        for first_letter, f in self.first_letters.items():
+            lo, hi = self.span(first_letter, 0)
+            masks = self.masks[lo:hi]
+            lengths = self.lengths[lo:hi]
+            for c in range(26):
+                # Count by exact length, then turn into counts by minimum length
+                counts = np.bincount(lengths[((masks >> c) & 1) == 1], minlength=max_len + 1)
+                self.pair_counts[f, c] = np.cumsum(counts[::-1])[::-1]
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def span(self, letter: str, min_len: int = 1) -> Tuple[int, int]:
+        starts = self.offsets.get(letter)
+        if not starts:
+            return 0, 0
+        return starts[min(max(min_len, 0), len(starts) - 1)], starts[-1]
+
+    def id_of(self, word: str) -> Optional[int]:
+        # A word's id is its position in the index, found by binary search in its (first letter, length) bucket
+        starts = self.offsets.get(word[:1])
+        if not starts or len(word) >= len(starts) - 1:
+            return None
+        i = bisect_left(self.words, word, starts[len(word)], starts[len(word) + 1])
+        return i if i < len(self.words) and self.words[i] == word else None
+
+    def count(self, letter: Optional[str] = None, min_len: int = 1) -> int:
+        if letter:
+            lo, hi = self.span(letter, min_len)
+            return hi - lo
+        return sum(self.count(c, min_len) for c in self.offsets)
+
+    def slice(self, letter: Optional[str] = None, min_len: int = 1) -> List[str]:
+        if letter:
+            return self.words[slice(*self.span(letter, min_len))]
+        words = []
+        for c in self.offsets:
+            words += self.words[slice(*self.span(c, min_len))]
+        return words
+
+    def count_containing(self, letter: Optional[str], required_letter: str, min_len: int = 1) -> int:
+        # Number of words starting with letter (any letter if None),
+        # containing required_letter and having at least min_len letters
+        c = ord(required_letter) - ord("a")
+        if not 0 <= c < 26:
+            # Not in the letter masks, so count by scanning the words
+            return sum(required_letter in word for word in self.slice(letter, min_len))
+        n = min(max(min_len, 0), self.pair_counts.shape[2] - 1)
+        if not letter:
+            return int(self.pair_counts[:, c, n].sum())
+        f = self.first_letters.get(letter)
+        return int(self.pair_counts[f, c, n]) if f is not None else 0
+
+    def can_avoid(self, letter: Optional[str], banned_letters: Iterable[str], min_len: int = 1) -> bool:
+        # Whether any word starting with letter (any letter if None),
+        # having at least min_len letters contains none of banned_letters.
+        # Subtracting the words containing each banned letter from the total gives a lower bound
+        # in constant time, the words are only scanned when that is inconclusive.
+        letters = [letter] if letter else list(self.offsets)
+        total = sum(self.count(c, min_len) for c in letters)
+        if total - sum(self.count_containing(letter, b, min_len) for b in set(banned_letters)) > 0:
+            return True
+        return any(len(self.select(min_len, c, banned_letters=banned_letters)) for c in letters)
+
+    def select(
+        self,
+        min_len: int = 1,
+        letter: Optional[str] = None,
+        required_letter: Optional[str] = None,
+        banned_letters: Optional[Iterable[str]] = None,
+        exclude_words: Optional["UsedWords"] = None
+    ) -> np.ndarray:
+        # Positions (word ids) of the words matching every given condition
+        if letter:
+            lo, hi = self.span(letter, min_len)
+            matches = np.ones(hi - lo, dtype=bool)
+        else:
+            lo, hi = 0, len(self.words)
+            matches = self.lengths >= min_len
+        masks = self.masks[lo:hi]
+        if required_letter:
+            mask = letter_mask(required_letter)
+            if mask:
+                matches &= (masks & mask) != 0
+            else:  # Not in the letter masks, e.g. a Turkish letter
+                matches &= np.fromiter(
+                    (required_letter in word for word in self.words[lo:hi]), dtype=bool, count=hi - lo
+                )
+        if banned_letters:
+            matches &= (masks & letter_mask(banned_letters)) == 0
+        if exclude_words:
+            matches &= ~exclude_words.mask(self, lo, hi)
+        return np.flatnonzero(matches) + lo
+
+    @classmethod
+    def from_columns(
+        cls, words: Sequence[str], offsets: Dict[str, List[int]], columns: Dict[str, np.ndarray]
+    ) -> "WordIndex":
+        # Rebuild an index from the parts stored in a dictionary snapshot
+        index = cls.__new__(cls)
+        index.words = words
+        index.offsets = offsets
+        index.first_letters = {letter: f for f, letter in enumerate(offsets)}
+        for name in cls.columns:
+            setattr(index, name, columns[name])
+        return index
+
+    def random_word(self, min_len: int = 1, letter: Optional[str] = None) -> Optional[str]:
+        if letter:
+            lo, hi = self.span(letter, min_len)
+            return self.words[random.randrange(lo, hi)] if hi > lo else None
+
+        # Pick a group weighted by its number of matching words without building a list
+        total = self.count(min_len=min_len)
+        if not total:
+            return None
+        n = random.randrange(total)
+        for c in self.offsets:
+            lo, hi = self.span(c, min_len)
+            if n < hi - lo:
+                return self.words[lo + n]
+            n -= hi - lo
+
+
+# Compiled dictionary file layout:
+# magic, header length, JSON header (format version, SHA-256 digest of the body, where each section is
+# and what the dictionary was built from), then the body with the DAWG, the newline separated words and their
+# byte offsets, the word index arrays (with dtype and shape in the header) and the raw word list source,
+# each aligned to 8 bytes
+SNAPSHOT_MAGIC = b"WORDCHN\0"
+SNAPSHOT_VERSION = 5
+
+
+class Snapshot(NamedTuple):
+    dawg: CompletionDAWG
+    index: WordIndex
+    # HTTP validators of the word list source and checksum of the accepted and rejected words in the database
+    meta: Dict[str, Optional[str]]
+    source: memoryview  # Word list source as downloaded, used when only the database changed
+
+
+def dump_snapshot(dawg_data: bytes, index: WordIndex, source_text: str, meta: Dict[str, Optional[str]]) -> bytes:
+    words, word_starts = PackedWords.encode(list(index.words))
+    sections = [
+        ("dawg", dawg_data, None),
+        ("words", words, None),
+        ("word_starts", word_starts.tobytes(), [word_starts.dtype.str, word_starts.shape])
+    ]
+    for name in WordIndex.columns:
+        column = getattr(index, name)
+        sections.append((name, column.tobytes(), [column.dtype.str, column.shape]))
+    sections.append(("source", source_text.encode(), None))
+
+    body = bytearray()
+    layout = {}
+    for name, data, array_info in sections:
+        layout[name] = [len(body), len(data), array_info]
+        body += data
+        body += bytes(-len(body) % 8)
+
+    header = json.dumps(
+        {
+            "version": SNAPSHOT_VERSION,
+            "digest": hashlib.sha256(body).hexdigest(),
+            "offsets": index.offsets,
+            "sections": layout,
+            "meta": meta
+        }
+    ).encode()
+    head = SNAPSHOT_MAGIC + struct.pack("<I", len(header)) + header
+    return head + bytes(-len(head) % 8) + body
+
+
+def load_snapshot(buffer: Union[bytes, mmap.mmap]) -> Snapshot:
+    # Words and word index columns are views into the buffer rather than copies,
+    # so processes mapping the same file share one copy of them.
+    # The DAWG library keeps its own copy of the DAWG however, so that is loaded into each process.
+    view = memoryview(buffer)
+    if bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError("Not a dictionary snapshot")
+    (header_len,) = struct.unpack_from("<I", buffer, len(SNAPSHOT_MAGIC))
+    header_start = len(SNAPSHOT_MAGIC) + 4
+    header = json.loads(bytes(view[header_start:header_start + header_len]))
+    if header["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported dictionary snapshot version {header['version']}")
+
+    body_start = header_start + header_len
+    body_start += -body_start % 8
+    if hashlib.sha256(view[body_start:]).hexdigest() != header["digest"]:
+        raise ValueError("Dictionary snapshot is corrupted")
+
+    def section(name: str) -> memoryview:
+        offset, size, _ = header["sections"][name]
+        return view[body_start + offset:body_start + offset + size]
+
+    def array(name: str) -> np.ndarray:
+        offset, size, (dtype, shape) = header["sections"][name]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(
+            buffer, dtype=dtype, count=size // dtype.itemsize, offset=body_start + offset
+        ).reshape(shape)
+
+    dawg = CompletionDAWG().frombytes(bytes(section("dawg")))
+    words = PackedWords(section("words"), array("word_starts"))
+    columns = {name: array(name) for name in WordIndex.columns}
+    index = WordIndex.from_columns(words, header["offsets"], columns)
+    return Snapshot(dawg, index, header["meta"], section("source"))
+
+
+def build_dictionary(
+    source_text: str, db_words: List[str], rejected_words: List[str], meta: Dict[str, Optional[str]], path: str
+) -> Optional[bytes]:
+    # Runs in a worker process.
+    # The compiled dictionary is written to path, or returned if that fails.
+    wordlist = {w.lower() for w in source_text.splitlines() + db_words if w.isalpha()}
+    wordlist.difference_update(rejected_words)
+    data = dump_snapshot(CompletionDAWG(wordlist).tobytes(), WordIndex(wordlist), source_text, meta)
+    try:
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+    except OSError:
+        logger.exception("Sözlük dosyası yazılamadı")
+        return data
+    return None
+
+
 class Words:
     # Yönlendirilmiş asiklik kelime grafiği (DAWG)
     dawg: CompletionDAWG
+    # Words bucketed by first letter and length for fast random picks
+    index: WordIndex
     count: int
+    # What the current dictionary was built from, see Snapshot
+    meta: Dict[str, Optional[str]] = {}
+    source: Optional[memoryview] = None
+
+    # Changes made since the base dictionary was built, consulted together with it.
+    # The base is rebuilt in the background once there are more changes than overlay_limit.
+    added: Set[str] = set()
+    removed: Set[str] = set()
+    overlay_limit = 100
+
+    # Seconds spent building the last dictionary in the worker process
+    # and seconds the event loop was blocked loading it
+    build_time = 0.0
+    load_time = 0.0
+    update_lock = asyncio.Lock()  # Avoid building the dictionary several times at once
+
+    # With several worker processes, only the first builds the dictionary and the others load the snapshot it writes.
+    # Overlay changes made in one worker are passed on to the others through share_overlay.
+    builder = True
+    share_overlay: Optional[Callable[[str, List[str]], None]] = None
+    snapshot_id: Optional[Tuple[int, int]] = None  # Inode and modification time of the loaded snapshot file
+
+    @staticmethod
+    def load(buffer: Optional[bytes] = None) -> bool:
+        # Load a compiled dictionary, by default the snapshot file left by the last update.
+        # The file is memory mapped so several bot processes on the same host share the pages of the words
+        # and the word index, the DAWG is copied into each process.
+        t = time.perf_counter()
+        try:
+            snapshot_id = None
+            if buffer is None:
+                with open(DICTIONARY_SNAPSHOT, "rb") as f:
+                    stat = os.fstat(f.fileno())
+                    snapshot_id = (stat.st_ino, stat.st_mtime_ns)
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            snapshot = load_snapshot(buffer)
+        except (OSError, ValueError, KeyError):
+            logger.exception("Sözlük dosyası yüklenemedi")
+            return False
+
+        # Swap everything together so no handler sees a half updated dictionary
+        Words.dawg, Words.index = snapshot.dawg, snapshot.index
+        Words.meta, Words.source = snapshot.meta, snapshot.source
+        Words.snapshot_id = snapshot_id
+        # Drop overlay changes the new base already includes
+        Words.added = {w for w in Words.added if w not in Words.dawg}
+        Words.removed = {w for w in Words.removed if w in Words.dawg}
+        Words.count = len(Words.index) + len(Words.added) - len(Words.removed)
+        Words.load_time = time.perf_counter() - t
+        return True
+
+    @staticmethod
+    async def load_overlay() -> None:
+        # The overlay is only kept in memory, so after a restart it is made again from the words
+        # accepted or rejected in the database that the loaded dictionary does not reflect yet
+        from . import pool
+
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("SELECT word, accepted FROM wordlist;")
+        Words.added = {word for word, accepted in rows if accepted and word not in Words.dawg}
+        Words.removed = {word for word, accepted in rows if not accepted and word in Words.dawg}
+        Words.overlay_changed()
+
+    @staticmethod
+    def contains(word: str) -> bool:
+        return word in Words.added or word in Words.dawg and word not in Words.removed
+
+    @staticmethod
+    def iterkeys(prefix: str) -> Iterator[str]:
+        # Words starting with prefix, added words first
+        yield from sorted(w for w in Words.added if w.startswith(prefix))
+        for word in Words.dawg.iterkeys(prefix):
+            if word not in Words.removed:
+                yield word
+
+    @staticmethod
+    def add(words: Iterable[str], share: bool = True) -> None:
+        words = list(words)
+        for word in words:
+            Words.removed.discard(word)
+            if word not in Words.dawg:
+                Words.added.add(word)
+        Words.overlay_changed()
+        if share and Words.share_overlay:
+            Words.share_overlay("add", words)
+
+    @staticmethod
+    def remove(words: Iterable[str], share: bool = True) -> None:
+        words = list(words)
+        for word in words:
+            Words.added.discard(word)
+            if word in Words.dawg:
+                Words.removed.add(word)
+        Words.overlay_changed()
+        if share and Words.share_overlay:
+            Words.share_overlay("remove", words)
+
+    @staticmethod
+    def overlay_changed() -> None:
+        Words.count = len(Words.index) + len(Words.added) - len(Words.removed)
+        if (
+            Words.builder and len(Words.added) + len(Words.removed) > Words.overlay_limit
+            and not Words.update_lock.locked()
+        ):
+            asyncio.create_task(Words.update())
+
+    @staticmethod
+    async def reload() -> None:
+        # Load the snapshot again if another process replaced it
+        try:
+            stat = os.stat(DICTIONARY_SNAPSHOT)
+        except OSError:
+            return
+        if (stat.st_ino, stat.st_mtime_ns) != Words.snapshot_id:
+            Words.load()
 
     @staticmethod
     async def update() -> None:
         # Ek onaylı kelimelerle çevrimiçi repo ve veritabanı tablosundan alınan kelimeler
+        # The dictionary is only rebuilt when the source or the accepted or rejected words in the database changed
         logger.info("Kelimeleri alıyorum")
 
-        async def get_words_from_source() -> List[str]:
+        async def get_words_from_source() -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+            # Returns None as the text if the source is unchanged since the last build
             from . import session
 
-            async with session.get(WORDLIST_SOURCE) as resp:
-                return (await resp.text()).splitlines()
+            headers = {}
+            if Words.source is not None:
+                if Words.meta.get("etag"):
+                    headers["If-None-Match"] = Words.meta["etag"]
+                if Words.meta.get("last_modified"):
+                    headers["If-Modified-Since"] = Words.meta["last_modified"]
+
+            async with session.get(WORDLIST_SOURCE, headers=headers) as resp:
+                if resp.status == 304:
+                    return None, {"etag": Words.meta.get("etag"), "last_modified": Words.meta.get("last_modified")}
+                resp.raise_for_status()
+                return await resp.text(), {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified")
+                }
+
+        async def get_db_digest() -> Optional[str]:
+            from . import pool
+
+            async with pool.acquire() as conn:
+                return await conn.fetchval(
+                    "SELECT md5(string_agg(word || ' ' || accepted, E'\\n' ORDER BY word)) FROM wordlist;"
+                )
 
         async def get_words_from_db() -> List[str]:
             from . import pool
@@ -32,14 +514,117 @@ class Words:
                 res = await conn.fetch("NEREDE kabul edildi kelime listesinden kelime SEÇ;")
                 return [row[0] for row in res]
 
-        source_task = asyncio.create_task(get_words_from_source())
-        db_task = asyncio.create_task(get_words_from_db())
-        wordlist = await source_task + await db_task
+        async def get_rejected_words_from_db() -> List[str]:
+            from . import pool
+
+            async with pool.acquire() as conn:
+                res = await conn.fetch("SELECT word FROM wordlist WHERE NOT accepted;")
+                return [row[0] for row in res]
+
+        async with Words.update_lock:
+            source_task = asyncio.create_task(get_words_from_source())
+            db_digest_task = asyncio.create_task(get_db_digest())
+            source_text, meta = await source_task
+            meta["db_digest"] = await db_digest_task
+
+            if source_text is None and meta["db_digest"] == Words.meta.get("db_digest"):
+                logger.info("Kelime listesi değişmedi")
+                return
+            if source_text is None:  # Only the database changed
+                source_text = str(Words.source, "utf-8")
+            db_words = await get_words_from_db()
+            rejected_words = await get_rejected_words_from_db()
+
+            logger.info("Kelimeleri işliyor")
+
+            t = time.perf_counter()
+            data = await asyncio.get_running_loop().run_in_executor(
+                get_executor(), build_dictionary, source_text, db_words, rejected_words, meta, DICTIONARY_SNAPSHOT
+            )
+            build_time = time.perf_counter() - t
+
+            if not Words.load(data):
+                raise RuntimeError("Derlenen sözlük yüklenemedi")
+            Words.build_time = build_time
+
+        logger.info(f"DAWG güncellendi ({Words.build_time:.3f}s, event loop {Words.load_time:.3f}s)")
+
+
+class UsedWords:
+    # Words used in a game.
+    # Dictionary words are kept as a bitset over word ids, anything else (e.g. recently added words) in a set.
+    # Used dictionary words are also counted per first letter and length so the number of
+    # words still available for a turn is known without scanning.
+
+    __slots__ = ("index", "bits", "others", "size", "counts")
+
+    def __init__(self) -> None:
+        self.index: Optional[WordIndex] = None
+        self.bits = bytearray()
+        self.others: Set[str] = set()
+        self.size = 0
+        # First letter mapped to a list where the n-th item is the number of used words with at least n letters
+        self.counts: Dict[str, List[int]] = {}
+
+    def sync(self, index: Optional[WordIndex] = None) -> None:
+        # Word ids change when the dictionary is rebuilt, so carry used words over to the new index
+        index = index or Words.index
+        if self.index is index:
+            return
+        words = list(self)
+        self.index = index
+        self.bits = bytearray((len(index) + 7) // 8)
+        self.others = set()
+        self.size = 0
+        self.counts = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        self.sync()
+        i = self.index.id_of(word)
+        if i is None:
+            if word not in self.others:
+                self.others.add(word)
+                self.size += 1
+            return
+        flag = 0x80 >> (i & 7)
+        if not self.bits[i >> 3] & flag:
+            self.bits[i >> 3] |= flag
+            self.size += 1
+            counts = self.counts.setdefault(word[0], [0] * len(self.index.offsets[word[0]]))
+            for n in range(len(word) + 1):
+                counts[n] += 1
+
+    def __contains__(self, word: str) -> bool:
+        self.sync()
+        i = self.index.id_of(word)
+        if i is None:
+            return word in self.others
+        return bool(self.bits[i >> 3] & (0x80 >> (i & 7)))
+
+    def __iter__(self) -> Iterator[str]:
+        if self.index is not None:
+            for i in np.flatnonzero(np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8))):
+                yield self.index.words[i]
+        yield from self.others
 
-        logger.info("Kelimeleri işliyor")
+    def __len__(self) -> int:
+        return self.size
 
-        wordlist = [w.lower() for w in wordlist if w.isalpha()]
-        Words.dawg = CompletionDAWG(wordlist)
-        Words.count = len(Words.dawg.keys())
+    def remaining(self, letter: str, min_len: int = 1) -> int:
+        # Number of unused words starting with letter and having at least min_len letters
+        self.sync()
+        counts = self.counts.get(letter)
+        used = counts[min(max(min_len, 0), len(counts) - 1)] if counts else 0
+        cnt = self.index.count(letter, min_len) - used
+        # The overlay holds at most Words.overlay_limit words
+        cnt -= sum(1 for w in Words.removed if w[0] == letter and len(w) >= min_len and w not in self)
+        cnt += sum(1 for w in Words.added if w[0] == letter and len(w) >= min_len and w not in self.others)
+        return cnt
 
-        logger.info("DAWG güncellendi")
+    def mask(self, index: WordIndex, lo: int, hi: int) -> np.ndarray:
+        # Whether each word with id in [lo, hi) of index is used
+        self.sync(index)
+        bits = np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8)[lo >> 3:(hi + 7) >> 3])
+        return bits[lo & 7:(lo & 7) + hi - lo].astype(bool)